@@ -23,6 +23,10 @@ GRID_SPACING_PERCENT = 0.3      # Espaciado entre niveles en porcentaje - OPTIMI
 
 # Configuración de intervalos
 CHECK_INTERVAL = 180  # Intervalo para verificar precios (en segundos) - OPTIMIZADO: Reducido para mayor reactividad
+STREAM_MAX_PRICE_AGE = 30  # Antigüedad máxima (segundos) del último precio en caché antes de volver a consultarlo por REST
+STATUS_LOG_PRICE_BPS = 5  # Movimiento mínimo del precio (puntos básicos) para volver a registrar el estado en el log
+WAKE_PRICE_MOVE_PERCENT = 0.1  # Movimiento del precio (%) que despierta al bot optimizado para revisar los trailing stops antes de CHECK_INTERVAL
+MARKET_CONDITION_INTERVAL = 900  # Intervalo (segundos) con el que el sistema optimizado reevalúa la condición del mercado en segundo plano
 
 # Configuración adicional de gestión de riesgos (OPTIMIZADO)
 MAX_DAILY_LOSS_PERCENT = 1.5    # Pérdida máxima diaria permitida (%)
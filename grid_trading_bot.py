@@ -3,25 +3,58 @@
 Bot de Trading Automático con Grid Trading Adaptativo
 """
 
+import os
+import json
+import atexit
 import time
 import math
+import queue
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+import numpy as np
+from binance import ThreadedWebsocketManager
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
+from requests.adapters import HTTPAdapter
 import config
 
-# Configurar logging
+# Configurar logging: el bucle principal solo encola los registros y un QueueListener
+# realiza la escritura en fichero y consola desde un hilo aparte
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler("trading_bot.log"),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("trading_bot.log"),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',
+    handlers=[QueueHandler(_log_queue)]
 )
 logger = logging.getLogger("trading_bot")
 
+@lru_cache(maxsize=None)
+def _step_quantum(step):
+    """Devuelve el stepSize/tickSize como Decimal exacto (calculado una vez por valor)"""
+    return Decimal(str(step)).normalize()
+
+@lru_cache(maxsize=None)
+def _step_decimals(step):
+    """Devuelve el número de decimales de un stepSize/tickSize (p. ej. 0.00001 -> 5)"""
+    return max(0, -_step_quantum(step).as_tuple().exponent)
+
 class GridTradingBot:
     """
     Bot de trading que implementa la estrategia de Grid Trading Adaptativo
@@ -48,29 +81,233 @@ class GridTradingBot:
         self.grid_levels = config.GRID_LEVELS
         self.grid_spacing_percent = config.GRID_SPACING_PERCENT
         
+        # Peso del tamaño de orden de cada nivel según su distancia al nivel central
+        # (órdenes más pequeñas en los extremos); solo depende de grid_levels
+        levels = np.arange(self.grid_levels)
+        distance_factor = 1 - np.abs(levels - (self.grid_levels - 1) / 2) / (self.grid_levels - 1)
+        self._size_weights = 0.5 + 0.5 * distance_factor
+        
         # Estado del bot
-        self.active_orders = {}
+        # Órdenes activas en arrays paralelos (SoA) de capacidad fija: las posiciones
+        # [0, _ord_head) están ocupadas; 64 supera con margen el número de niveles
+        self._ord_ids = np.zeros(64, dtype=np.int64)
+        self._ord_price = np.zeros(64)
+        self._ord_qty = np.zeros(64)
+        self._ord_side = np.zeros(64, dtype=np.int8)    # 1 = BUY, -1 = SELL
+        self._ord_status = np.zeros(64, dtype=np.int8)  # 0 = NEW, 1 = PARTIALLY_FILLED
+        self._ord_head = 0
+        self._orders_lock = threading.Lock()
         self.completed_trades = []
         self.daily_trades_count = 0
-        self.last_grid_update = datetime.now()
+        self.last_grid_update = datetime.now()  # Solo para registro y persistencia
+        self._last_grid_update_mono = time.monotonic()
         self.grid_prices = []
+        self._last_volatility = None
+        self._last_volatility_update = None
+        
+        # Estado de la cuadrícula persistido entre reinicios
+        self._grid_state_file = "grid_state.json"
+        self._load_grid_state()
+        
+        # Reglas del mercado en caché (se refrescan cada 24 horas)
+        self._step_size = None
+        self._tick_size = None
+        self._symbol_info_update = None
+        
+        # Estado alimentado por los streams WebSocket (ticker y datos de usuario)
+        self._ws_manager = None
+        self._last_price = None
+        self._last_price_time = 0.0
+        self._balances = {}
+        self._last_logged = {}
+        self._order_events = queue.Queue()
+        self._order_events_pending = threading.Event()
+        
+        # Ventana de cierres horarios (24 h) con media y M2 de Welford para la volatilidad en O(1) por vela
+        self._closes = deque(maxlen=24)
+        self._closes_mean = 0.0
+        self._closes_m2 = 0.0
+        self._closes_lock = threading.Lock()
+        
+        # Pool de hilos para enviar las órdenes de la cuadrícula en paralelo
+        self._order_executor = ThreadPoolExecutor(max_workers=self.grid_levels)
+        # Conexiones keep-alive suficientes para que las peticiones en paralelo reutilicen
+        # sockets TLS en lugar de abrir y descartar conexiones del pool
+        self.client.session.mount("https://", HTTPAdapter(pool_maxsize=self.grid_levels))
         
         logger.info(f"Bot inicializado para {self.symbol} con {self.grid_levels} niveles")
     
-    def get_account_balance(self, asset="USDT"):
-        """Obtiene el balance disponible de un activo específico"""
+    def _load_grid_state(self):
+        """Carga la última cuadrícula calculada si tiene menos de 24 horas y corresponde a la configuración actual"""
+        if not os.path.exists(self._grid_state_file):
+            return False
         try:
-            account_info = self.client.get_account()
-            for balance in account_info['balances']:
-                if balance['asset'] == asset:
-                    return float(balance['free'])
-            return 0.0
+            with open(self._grid_state_file, 'r') as f:
+                state = json.load(f)
+            last_update = datetime.fromisoformat(state['last_grid_update'])
+            if (state['symbol'] != self.symbol or len(state['grid_prices']) != self.grid_levels
+                    or (datetime.now() - last_update).total_seconds() >= 24 * 3600):
+                return False
+            self.grid_prices = state['grid_prices']
+            self.last_grid_update = last_update
+            self._last_grid_update_mono = time.monotonic() - (datetime.now() - last_update).total_seconds()
+            self._last_volatility = state['volatility']
+            self._last_volatility_update = datetime.fromisoformat(state['volatility_update'])
+            logger.info(f"Cuadrícula restaurada desde {self._grid_state_file}: {self.grid_prices}")
+            return True
+        except Exception as e:
+            logger.error(f"Error al cargar el estado de la cuadrícula: {e}")
+            return False
+    
+    def _save_grid_state(self):
+        """Guarda la cuadrícula actual para reutilizarla tras un reinicio"""
+        try:
+            with open(self._grid_state_file, 'w') as f:
+                json.dump({
+                    'symbol': self.symbol,
+                    'grid_prices': self.grid_prices,
+                    'volatility': self._last_volatility,
+                    'volatility_update': self._last_volatility_update.isoformat(),
+                    'last_grid_update': self.last_grid_update.isoformat()
+                }, f, indent=2)
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar el estado de la cuadrícula: {e}")
+            return False
+    
+    def start_streams(self):
+        """Inicia los streams WebSocket de ticker y de datos de usuario para evitar el polling REST"""
+        if self._ws_manager:
+            return True
+        try:
+            self._ws_manager = ThreadedWebsocketManager(
+                api_key=config.TESTNET_API_KEY,
+                api_secret=config.TESTNET_API_SECRET,
+                testnet=True
+            )
+            self._ws_manager.start()
+            self._ws_manager.start_symbol_ticker_socket(callback=self._handle_ticker_event, symbol=self.symbol)
+            self._ws_manager.start_user_socket(callback=self._handle_user_event)
+            self._ws_manager.start_kline_socket(
+                callback=self._handle_kline_event, symbol=self.symbol, interval=Client.KLINE_INTERVAL_1HOUR
+            )
+            logger.info(f"Streams WebSocket iniciados para {self.symbol}")
+            return True
+        except Exception as e:
+            logger.error(f"Error al iniciar streams WebSocket, se usará REST: {e}")
+            self._ws_manager = None
+            return False
+    
+    def stop_streams(self):
+        """Detiene los streams WebSocket"""
+        if self._ws_manager:
+            self._ws_manager.stop()
+            self._ws_manager = None
+            self._last_price = None
+            self._balances = {}
+            with self._closes_lock:
+                self._closes.clear()
+            logger.info("Streams WebSocket detenidos")
+    
+    def _handle_ticker_event(self, msg):
+        """Actualiza el último precio a partir del stream <symbol>@ticker"""
+        if msg.get('e') == 'error':
+            logger.error(f"Error en el stream de ticker: {msg}")
+            return
+        self._last_price = float(msg['c'])
+        self._last_price_time = time.monotonic()
+    
+    def _handle_user_event(self, msg):
+        """Actualiza los balances a partir de los eventos outboundAccountPosition del stream de usuario"""
+        if msg.get('e') == 'error':
+            logger.error(f"Error en el stream de usuario: {msg}")
+        elif msg.get('e') == 'outboundAccountPosition':
+            for balance in msg['B']:
+                self._balances[balance['a']] = float(balance['f'])
+        elif msg.get('e') == 'executionReport' and msg['s'] == self.symbol:
+            # Encolar el evento y despertar al bucle principal
+            self._order_events.put(msg)
+            self._order_events_pending.set()
+    
+    def _handle_kline_event(self, msg):
+        """Incorpora a la ventana de volatilidad cada vela horaria cerrada del stream <symbol>@kline_1h"""
+        if msg.get('e') == 'error':
+            logger.error(f"Error en el stream de velas: {msg}")
+            return
+        if msg['k']['x']:
+            with self._closes_lock:
+                if self._closes:
+                    self._ingest_close(float(msg['k']['c']))
+    
+    def _ingest_close(self, close):
+        """Añade un cierre a la ventana actualizando media y M2 (Welford), retirando el más antiguo si está llena"""
+        if len(self._closes) == self._closes.maxlen:
+            oldest = self._closes.popleft()
+            n = len(self._closes)
+            if n == 0:
+                self._closes_mean = 0.0
+                self._closes_m2 = 0.0
+            else:
+                delta = oldest - self._closes_mean
+                self._closes_mean -= delta / n
+                self._closes_m2 = max(0.0, self._closes_m2 - delta * (oldest - self._closes_mean))
+        
+        self._closes.append(close)
+        delta = close - self._closes_mean
+        self._closes_mean += delta / len(self._closes)
+        self._closes_m2 += delta * (close - self._closes_mean)
+    
+    def _seed_closes(self):
+        """Carga la ventana de cierres desde la API REST y recalcula media y M2 desde cero"""
+        klines = self.client.get_historical_klines(
+            self.symbol, Client.KLINE_INTERVAL_1HOUR, "1 day ago UTC"
+        )
+        # La última vela sigue abierta si su hora de cierre aún no ha llegado: se descarta, porque el stream
+        # añadirá su cierre definitivo y la hora contaría dos veces
+        if klines and klines[-1][6] > time.time() * 1000:
+            klines = klines[:-1]
+        closes = np.fromiter((kline[4] for kline in klines), dtype=np.float64, count=len(klines))  # Precio de cierre
+        closes = closes[-self._closes.maxlen:]
+        self._closes.clear()
+        self._closes.extend(closes.tolist())
+        self._closes_mean = float(closes.mean())
+        self._closes_m2 = float(((closes - self._closes_mean) ** 2).sum())
+    
+    def wait_for_order_events(self, timeout):
+        """Espera hasta que llegue un evento de orden o venza el timeout; devuelve True si hubo eventos"""
+        received = self._order_events_pending.wait(timeout)
+        self._order_events_pending.clear()
+        return received
+    
+    @property
+    def balances_streaming(self):
+        """Indica si los balances se reciben por el stream de usuario (sin consultas REST)"""
+        return self._ws_manager is not None and bool(self._balances)
+    
+    def get_account_balance(self, asset="USDT", account_info=None):
+        """
+        Obtiene el balance disponible de un activo específico. Si no está en la caché del stream,
+        se usa account_info (respuesta de get_account ya obtenida) o se consulta la cuenta.
+        """
+        if self._ws_manager and asset in self._balances:
+            return self._balances[asset]
+        try:
+            if account_info is None:
+                account_info = self.client.get_account()
+            balances = {balance['asset']: float(balance['free']) for balance in account_info['balances']}
+            if self._ws_manager:
+                # Sembrar la caché; a partir de aquí el stream de usuario la mantiene actualizada
+                self._balances = balances
+                self._balances.setdefault(asset, 0.0)
+            return balances.get(asset, 0.0)
         except BinanceAPIException as e:
             logger.error(f"Error al obtener balance: {e}")
             return 0.0
     
     def get_current_price(self):
         """Obtiene el precio actual del par de trading"""
+        if self._last_price is not None and time.monotonic() - self._last_price_time < config.STREAM_MAX_PRICE_AGE:
+            return self._last_price
         try:
             ticker = self.client.get_symbol_ticker(symbol=self.symbol)
             return float(ticker['price'])
@@ -78,23 +315,47 @@ class GridTradingBot:
             logger.error(f"Error al obtener precio: {e}")
             return None
     
+    def _get_symbol_filters(self):
+        """Obtiene (step_size, tick_size) de los filtros LOT_SIZE y PRICE_FILTER, consultando la API como máximo una vez cada 24 horas"""
+        if self._step_size is None or time.monotonic() - self._symbol_info_update >= 24 * 3600:
+            info = self.client.get_symbol_info(self.symbol)
+            filters = {f['filterType']: f for f in info['filters']}
+            self._step_size = float(filters['LOT_SIZE']['stepSize'])
+            self._tick_size = float(filters['PRICE_FILTER']['tickSize'])
+            self._symbol_info_update = time.monotonic()
+        return self._step_size, self._tick_size
+    
     def calculate_grid_prices(self):
         """Calcula los precios de la cuadrícula basados en el precio actual y la volatilidad"""
         current_price = self.get_current_price()
         if not current_price:
             return False
         
-        # Obtener datos históricos para calcular la volatilidad
-        klines = self.client.get_historical_klines(
-            self.symbol, Client.KLINE_INTERVAL_1HOUR, "1 day ago UTC"
-        )
+        # La volatilidad solo se recalcula cada 24 horas (o siempre, si el stream de velas la mantiene
+        # sin coste); un simple recentrado por salida de rango reutiliza la última estimación
+        if (self._ws_manager or self._last_volatility is None
+                or (datetime.now() - self._last_volatility_update).total_seconds() >= 24 * 3600):
+            volatility = self._recompute_volatility()
+        else:
+            volatility = self._last_volatility
         
-        # Calcular la volatilidad (desviación estándar de los precios)
-        prices = [float(kline[4]) for kline in klines]  # Precio de cierre
-        avg_price = sum(prices) / len(prices)
-        variance = sum([(p - avg_price) ** 2 for p in prices]) / len(prices)
-        volatility = math.sqrt(variance) / avg_price * 100  # Volatilidad en porcentaje
+        self._recenter_grid(current_price, volatility)
+        return True
+    
+    def _recompute_volatility(self):
+        """Calcula la volatilidad (desviación estándar de los cierres horarios de las últimas 24 h) en porcentaje"""
+        # Con el stream de velas activo la ventana se mantiene sola; si no, se recarga por REST
+        with self._closes_lock:
+            if not self._ws_manager or not self._closes:
+                self._seed_closes()
+            volatility = math.sqrt(self._closes_m2 / len(self._closes)) / self._closes_mean * 100
         
+        self._last_volatility = volatility
+        self._last_volatility_update = datetime.now()
+        return volatility
+    
+    def _recenter_grid(self, current_price, volatility):
+        """Construye la cuadrícula alrededor del precio actual a partir de una volatilidad dada"""
         # Ajustar el espaciado de la cuadrícula según la volatilidad
         # Más volatilidad = mayor espaciado
         adjusted_spacing = max(self.grid_spacing_percent, volatility / 10)
@@ -104,17 +365,14 @@ class GridTradingBot:
         upper_limit = current_price * (1 + grid_range / 100)
         lower_limit = current_price * (1 - grid_range / 100)
         
-        # Crear la cuadrícula de precios
-        self.grid_prices = []
-        for i in range(self.grid_levels):
-            # Distribuir los niveles uniformemente entre los límites
-            level_price = lower_limit + (upper_limit - lower_limit) * i / (self.grid_levels - 1)
-            self.grid_prices.append(round(level_price, 2))
+        # Crear la cuadrícula de precios distribuyendo los niveles uniformemente entre los límites
+        self.grid_prices = np.round(np.linspace(lower_limit, upper_limit, self.grid_levels), 2).tolist()
         
         self.last_grid_update = datetime.now()
+        self._last_grid_update_mono = time.monotonic()
+        self._save_grid_state()
         logger.info(f"Cuadrícula actualizada: {self.grid_prices}")
         logger.info(f"Volatilidad: {volatility:.2f}%, Espaciado ajustado: {adjusted_spacing:.2f}%")
-        return True
     
     def place_grid_orders(self):
         """Coloca órdenes de compra y venta en los niveles de la cuadrícula"""
@@ -126,117 +384,205 @@ class GridTradingBot:
         if not current_price:
             return False
         
+        # Obtener las reglas del mercado (en caché) en paralelo con la cancelación, que no depende de ellas
+        filters_future = self._order_executor.submit(self._get_symbol_filters)
+        
         # Cancelar órdenes activas existentes
         self.cancel_all_orders()
         
-        # Calcular el tamaño de la orden base
+        # Calcular el tamaño de la orden base (después de cancelar, para contar el saldo liberado)
         usdt_balance = self.get_account_balance("USDT")
         order_size_usdt = min(self.investment_amount, usdt_balance * self.risk_percentage / 100)
         
-        # Colocar nuevas órdenes en cada nivel de la cuadrícula
-        for i, price in enumerate(self.grid_prices):
-            try:
-                # Ajustar el tamaño de la orden según la distancia desde el precio medio
-                # Órdenes más pequeñas en los extremos
-                distance_factor = 1 - abs(i - (self.grid_levels - 1) / 2) / (self.grid_levels - 1)
-                adjusted_order_size = order_size_usdt * (0.5 + 0.5 * distance_factor)
-                
-                # Calcular la cantidad en la moneda base (BTC)
-                quantity = adjusted_order_size / price
+        try:
+            step_size, tick_size = filters_future.result()
+        except BinanceAPIException as e:
+            logger.error(f"Error al obtener información del símbolo: {e}")
+            return False
+        
+        # Ajustar el tamaño de la orden según la distancia desde el precio medio
+        prices = np.asarray(self.grid_prices, dtype=np.float64)
+        adjusted_order_sizes = order_size_usdt * self._size_weights
+        
+        # Calcular la cantidad en la moneda base (BTC), redondeada según las reglas del mercado
+        quantities = self.round_step_size(adjusted_order_sizes / prices, step_size)
+        
+        # Formatear precios y cantidades una sola vez según tickSize/stepSize, para enviarlos
+        # a la API como cadenas exactas en lugar de floats
+        price_decimals = _step_decimals(tick_size)
+        quantity_decimals = _step_decimals(step_size)
+        price_strs = [f"{price:.{price_decimals}f}" for price in self.grid_prices]
+        quantity_strs = [f"{quantity:.{quantity_decimals}f}" for quantity in quantities]
+        
+        # Colocar nuevas órdenes en cada nivel de la cuadrícula; las peticiones son independientes,
+        # así que se envían en paralelo en lugar de encadenar un round trip tras otro
+        list(self._order_executor.map(
+            self._place_grid_order, self.grid_prices, price_strs, quantity_strs, repeat(current_price)
+        ))
+        
+        return True
+    
+    def _place_grid_order(self, level_price, price, quantity, current_price):
+        """Coloca la orden de un nivel de la cuadrícula (compra por debajo del precio actual, venta por encima)"""
+        try:
+            if level_price < current_price:
+                # Colocar orden de compra
+                order = self.client.create_test_order(
+                    symbol=self.symbol,
+                    side=Client.SIDE_BUY,
+                    type=Client.ORDER_TYPE_LIMIT,
+                    timeInForce=Client.TIME_IN_FORCE_GTC,
+                    quantity=quantity,
+                    price=price
+                )
+                logger.info(f"Orden de compra colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
                 
-                # Redondear la cantidad según las reglas del mercado
-                info = self.client.get_symbol_info(self.symbol)
-                lot_size_filter = next(filter(lambda x: x['filterType'] == 'LOT_SIZE', info['filters']))
-                step_size = float(lot_size_filter['stepSize'])
-                quantity = self.round_step_size(quantity, step_size)
+                # En un entorno real, usaríamos:
+                # order = self.client.create_order(...)
+                # self._track_order(order['orderId'], level_price, float(quantity), Client.SIDE_BUY)
                 
-                if price < current_price:
-                    # Colocar orden de compra
-                    order = self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=Client.SIDE_BUY,
-                        type=Client.ORDER_TYPE_LIMIT,
-                        timeInForce=Client.TIME_IN_FORCE_GTC,
-                        quantity=quantity,
-                        price=price
-                    )
-                    logger.info(f"Orden de compra colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
-                    
-                    # En un entorno real, usaríamos:
-                    # order = self.client.create_order(...)
-                    # self.active_orders[order['orderId']] = {
-                    #     'price': price,
-                    #     'quantity': quantity,
-                    #     'side': 'BUY',
-                    #     'status': 'NEW'
-                    # }
-                    
-                else:
-                    # Colocar orden de venta
-                    order = self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=Client.SIDE_SELL,
-                        type=Client.ORDER_TYPE_LIMIT,
-                        timeInForce=Client.TIME_IN_FORCE_GTC,
-                        quantity=quantity,
-                        price=price
-                    )
-                    logger.info(f"Orden de venta colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
-                    
-                    # En un entorno real, usaríamos:
-                    # order = self.client.create_order(...)
-                    # self.active_orders[order['orderId']] = {
-                    #     'price': price,
-                    #     'quantity': quantity,
-                    #     'side': 'SELL',
-                    #     'status': 'NEW'
-                    # }
+            else:
+                # Colocar orden de venta
+                order = self.client.create_test_order(
+                    symbol=self.symbol,
+                    side=Client.SIDE_SELL,
+                    type=Client.ORDER_TYPE_LIMIT,
+                    timeInForce=Client.TIME_IN_FORCE_GTC,
+                    quantity=quantity,
+                    price=price
+                )
+                logger.info(f"Orden de venta colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
                 
-            except BinanceAPIException as e:
-                logger.error(f"Error al colocar orden en nivel {price}: {e}")
-        
-        return True
+                # En un entorno real, usaríamos:
+                # order = self.client.create_order(...)
+                # self._track_order(order['orderId'], level_price, float(quantity), Client.SIDE_SELL)
+            
+        except BinanceAPIException as e:
+            logger.error(f"Error al colocar orden en nivel {price}: {e}")
+    
+    def _track_order(self, order_id, price, quantity, side):
+        """Registra una orden activa en la siguiente posición libre de los arrays de órdenes"""
+        with self._orders_lock:
+            n = self._ord_head
+            if n == len(self._ord_ids):
+                logger.error(f"No se puede registrar la orden {order_id}: capacidad de {n} órdenes agotada")
+                return False
+            self._ord_ids[n] = order_id
+            self._ord_price[n] = price
+            self._ord_qty[n] = quantity
+            self._ord_side[n] = 1 if side == Client.SIDE_BUY else -1
+            self._ord_status[n] = 0
+            self._ord_head = n + 1
+            return True
+    
+    def _find_order(self, order_id):
+        """Devuelve la posición de una orden activa o -1 (una sola comparación vectorizada)"""
+        hits = np.flatnonzero(self._ord_ids[:self._ord_head] == order_id)
+        return int(hits[0]) if hits.size else -1
+    
+    def _update_order_fill(self, order_id, remaining_qty):
+        """Marca una orden como parcialmente ejecutada y actualiza su cantidad pendiente"""
+        with self._orders_lock:
+            i = self._find_order(order_id)
+            if i < 0:
+                return False
+            self._ord_qty[i] = remaining_qty
+            self._ord_status[i] = 1
+            return True
+    
+    def _untrack_order(self, order_id):
+        """Elimina una orden activa moviendo la última a su posición para mantener los arrays compactos"""
+        with self._orders_lock:
+            i = self._find_order(order_id)
+            if i < 0:
+                return False
+            last = self._ord_head - 1
+            for column in (self._ord_ids, self._ord_price, self._ord_qty, self._ord_side, self._ord_status):
+                column[i] = column[last]
+            self._ord_head = last
+            return True
+    
+    def _clear_orders(self):
+        """Vacía el registro de órdenes activas"""
+        with self._orders_lock:
+            self._ord_head = 0
+    
+    def get_active_orders_value(self):
+        """Valor nocional en USDT de las órdenes activas (suma de cantidad × precio)"""
+        with self._orders_lock:
+            n = self._ord_head
+            return float(np.vdot(self._ord_qty[:n], self._ord_price[:n]))
     
     def round_step_size(self, quantity, step_size):
-        """Redondea la cantidad al step_size más cercano"""
-        precision = int(round(-math.log10(step_size)))
-        return round(quantity - (quantity % step_size), precision)
+        """Redondea hacia abajo la cantidad (o un array de cantidades) al múltiplo de step_size"""
+        # División entera en Decimal sobre la representación más corta de cada float: exacta (0.3 / 0.1 da 3,
+        # no 2.9999...) y sin épsilon, de modo que el resultado nunca supera la cantidad original
+        step = _step_quantum(step_size)
+        floored = [float(Decimal(repr(q)) // step * step) for q in np.atleast_1d(quantity).tolist()]
+        return np.asarray(floored) if np.ndim(quantity) else floored[0]
     
     def cancel_all_orders(self):
         """Cancela todas las órdenes activas"""
         try:
-            orders = self.client.get_open_orders(symbol=self.symbol)
-            for order in orders:
-                self.client.cancel_order(
-                    symbol=self.symbol,
-                    orderId=order['orderId']
-                )
-                logger.info(f"Orden cancelada: {order['orderId']}")
+            # Una sola petición (DELETE /api/v3/openOrders) en lugar de una por orden
+            cancelled = self.client.cancel_all_open_orders(symbol=self.symbol)
+            logger.info(f"Órdenes canceladas: {[order['orderId'] for order in cancelled if 'orderId' in order]}")
             
-            self.active_orders = {}
+            self._clear_orders()
             return True
         except BinanceAPIException as e:
+            if e.code == -2011:
+                # Binance responde "Unknown order sent" cuando no hay órdenes abiertas
+                self._clear_orders()
+                return True
             logger.error(f"Error al cancelar órdenes: {e}")
             return False
     
     def check_completed_orders(self):
         """Verifica si hay órdenes completadas y actualiza el estado"""
         try:
-            # En un entorno real, verificaríamos las órdenes completadas
-            # y actualizaríamos self.completed_trades y self.daily_trades_count
+            # Procesar los eventos executionReport recibidos por el stream de usuario, sin peticiones REST
+            while True:
+                try:
+                    report = self._order_events.get_nowait()
+                except queue.Empty:
+                    break
+                
+                order_id = report['i']
+                status = report['X']
+                if status == 'PARTIALLY_FILLED':
+                    self._update_order_fill(order_id, float(report['q']) - float(report['z']))
+                    continue
+                if status != 'FILLED':
+                    if status in ('CANCELED', 'EXPIRED', 'REJECTED'):
+                        self._untrack_order(order_id)
+                    continue
+                
+                self._untrack_order(order_id)
+                # Precio medio de ejecución (importe acumulado en USDT / cantidad ejecutada): 'L' es solo
+                # el precio del último fill parcial
+                filled_qty = float(report['z'])
+                avg_price = float(report['Z']) / filled_qty if filled_qty else float(report['p'])
+                trade_data = {
+                    'order_id': order_id,
+                    'side': report['S'],
+                    'price': avg_price,
+                    'quantity': filled_qty,
+                    'timestamp': datetime.now().isoformat()
+                }
+                self.completed_trades.append(trade_data)
+                self.daily_trades_count += 1
+                logger.info(f"Orden completada: {trade_data}")
             
-            # Simulación para testnet
-            logger.info("Verificando órdenes completadas (simulación)")
             return True
-        except BinanceAPIException as e:
+        except (BinanceAPIException, KeyError, ValueError) as e:
             logger.error(f"Error al verificar órdenes completadas: {e}")
             return False
     
     def should_update_grid(self):
         """Determina si es necesario actualizar la cuadrícula"""
-        # Actualizar la cuadrícula si han pasado más de 24 horas
-        hours_since_update = (datetime.now() - self.last_grid_update).total_seconds() / 3600
-        if hours_since_update >= 24:
+        # Actualizar la cuadrícula si han pasado más de 24 horas (reloj monótono, inmune a ajustes del reloj del sistema)
+        if time.monotonic() - self._last_grid_update_mono >= 24 * 3600:
             return True
         
         # Actualizar si el precio actual está fuera del rango de la cuadrícula
@@ -250,6 +596,22 @@ class GridTradingBot:
         
         return False
     
+    def _log_status_if_changed(self, current_price, usdt_balance, base_balance):
+        """Registra el estado actual solo si el precio se ha movido al menos STATUS_LOG_PRICE_BPS o cambian balances u operaciones"""
+        last_price = self._last_logged.get('price')
+        price_moved = (current_price is None or last_price is None
+                       or abs(current_price - last_price) / last_price * 10000 >= config.STATUS_LOG_PRICE_BPS)
+        state = (usdt_balance, base_balance, self.daily_trades_count)
+        if not price_moved and state == self._last_logged.get('state'):
+            return False
+        
+        logger.info(f"Precio actual: {current_price} USDT")
+        logger.info(f"Balance USDT: {usdt_balance}")
+        logger.info(f"Balance {self.symbol.replace('USDT', '')}: {base_balance}")
+        logger.info(f"Operaciones hoy: {self.daily_trades_count}/{self.max_trades_per_day}")
+        self._last_logged = {'price': current_price, 'state': state}
+        return True
+    
     def reset_daily_counter(self):
         """Reinicia el contador diario de operaciones"""
         self.daily_trades_count = 0
@@ -260,12 +622,14 @@ class GridTradingBot:
         logger.info("Iniciando bot de trading...")
         
         try:
+            self.start_streams()
+            
             # Verificar conexión
             server_time = self.client.get_server_time()
             logger.info(f"Conectado a Binance. Tiempo del servidor: {server_time}")
             
-            # Configuración inicial
-            if not self.calculate_grid_prices():
+            # Configuración inicial (se reutiliza la cuadrícula persistida si sigue vigente)
+            if not self.grid_prices and not self.calculate_grid_prices():
                 logger.error("No se pudo calcular la cuadrícula inicial. Abortando.")
                 return
             
@@ -287,19 +651,15 @@ class GridTradingBot:
                     # Por ahora, simplemente reiniciamos el contador para la demostración
                     self.reset_daily_counter()
                 
-                # Mostrar estado actual
+                # Mostrar estado actual (solo si ha cambiado desde el último registro)
                 current_price = self.get_current_price()
                 usdt_balance = self.get_account_balance("USDT")
                 btc_balance = self.get_account_balance(self.symbol.replace("USDT", ""))
+                self._log_status_if_changed(current_price, usdt_balance, btc_balance)
                 
-                logger.info(f"Precio actual: {current_price} USDT")
-                logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.symbol.replace('USDT', '')}: {btc_balance}")
-                logger.info(f"Operaciones hoy: {self.daily_trades_count}/{self.max_trades_per_day}")
-                
-                # Esperar antes de la siguiente iteración
-                logger.info(f"Esperando {config.CHECK_INTERVAL} segundos...")
-                time.sleep(config.CHECK_INTERVAL)
+                # Esperar a un evento de orden o, como máximo, CHECK_INTERVAL para las comprobaciones periódicas
+                logger.debug(f"Esperando eventos de órdenes (máximo {config.CHECK_INTERVAL} segundos)...")
+                self.wait_for_order_events(config.CHECK_INTERVAL)
                 
         except KeyboardInterrupt:
             logger.info("Bot detenido manualmente.")
@@ -307,6 +667,8 @@ class GridTradingBot:
         except Exception as e:
             logger.error(f"Error inesperado: {e}")
             self.cancel_all_orders()
+        finally:
+            self.stop_streams()
 
 if __name__ == "__main__":
     bot = GridTradingBot()
@@ -3,25 +3,144 @@
 Bot de Trading Automático con Grid Trading Adaptativo (Versión Optimizada)
 """
 
+import atexit
 import time
-import math
+import queue
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from datetime import datetime
+from decimal import Decimal
+import numpy as np
+from binance import ThreadedWebsocketManager
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
+from requests.adapters import HTTPAdapter
 import config
 
-# Configurar logging
+# Configurar logging: el bucle principal solo encola los registros y un QueueListener
+# realiza la escritura en fichero y consola desde un hilo aparte (sin retener registros en memoria,
+# de modo que el log está al día para quien lo lea mientras el proceso sigue en marcha)
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler("trading_bot_optimized.log"),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("trading_bot_optimized.log"),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',
+    handlers=[QueueHandler(_log_queue)]
 )
 logger = logging.getLogger("trading_bot_optimized")
 
+def _step_decimals(step):
+    """Devuelve el número de decimales de un stepSize/tickSize (p. ej. 0.00001 -> 5, 0.5 -> 1)"""
+    return max(0, -Decimal(str(step)).normalize().as_tuple().exponent)
+
+# Constantes de la API enlazadas una sola vez a nivel de módulo (evita la búsqueda del atributo de clase en cada orden)
+_SIDE_BUY = Client.SIDE_BUY
+_SIDE_SELL = Client.SIDE_SELL
+_ORDER_TYPE_LIMIT = Client.ORDER_TYPE_LIMIT
+_TIF_GTC = Client.TIME_IN_FORCE_GTC
+_K1H = Client.KLINE_INTERVAL_1HOUR
+_K1H_MS = 60 * 60 * 1000  # Duración de una vela de 1h (ms)
+
+# Motivos de cierre de posición, codificados por su índice en el historial columnar de operaciones
+_CLOSE_REASONS = ('TAKE_PROFIT', 'STOP_LOSS', 'TRAILING_STOP')
+
+class Order:
+    """Datos de una orden de la cuadrícula; __slots__ evita el diccionario por instancia"""
+    
+    __slots__ = ('price', 'quantity', 'side', 'status', 'take_profit', 'stop_loss',
+                 'trailing_stop_activated', 'trailing_stop_price')
+    
+    def __init__(self, price, quantity, side, take_profit, stop_loss, status='NEW',
+                 trailing_stop_activated=False, trailing_stop_price=None):
+        """Inicializa la orden con sus niveles de take profit y stop loss"""
+        self.price = price
+        self.quantity = quantity
+        self.side = side
+        self.status = status
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.trailing_stop_activated = trailing_stop_activated
+        self.trailing_stop_price = trailing_stop_price
+
+class OrderBook:
+    """
+    Posiciones abiertas (órdenes ya ejecutadas) almacenadas por columnas en arrays NumPy,
+    para evaluar trailing stops, take profit y stop loss de todas ellas con operaciones vectorizadas.
+    Las posiciones ocupan los índices [0, count).
+    """
+    
+    _COLUMNS = ('order_ids', 'sides', 'entry_prices', 'quantities', 'take_profits',
+                'stop_losses', 'trailing_prices', 'trailing_activated')
+    
+    def __init__(self, capacity=32):
+        """Reserva las columnas con la capacidad inicial indicada"""
+        self.count = 0
+        self.order_ids = np.zeros(capacity, dtype=np.int64)
+        self.sides = np.zeros(capacity, dtype=np.int8)  # 1 = BUY, -1 = SELL
+        self.entry_prices = np.zeros(capacity)
+        self.quantities = np.zeros(capacity)
+        self.take_profits = np.zeros(capacity)
+        self.stop_losses = np.zeros(capacity)
+        self.trailing_prices = np.full(capacity, np.nan)
+        self.trailing_activated = np.zeros(capacity, dtype=bool)
+    
+    def add(self, order_id, order_data):
+        """Añade una posición a partir de su Order, duplicando la capacidad si está llena"""
+        if self.count == len(self.order_ids):
+            for name in self._COLUMNS:
+                setattr(self, name, np.resize(getattr(self, name), 2 * len(self.order_ids)))
+        i = self.count
+        self.order_ids[i] = order_id
+        self.sides[i] = 1 if order_data.side == 'BUY' else -1
+        self.entry_prices[i] = order_data.price
+        self.quantities[i] = order_data.quantity
+        self.take_profits[i] = order_data.take_profit
+        self.stop_losses[i] = order_data.stop_loss
+        self.trailing_prices[i] = np.nan
+        self.trailing_activated[i] = False
+        self.count = i + 1
+    
+    def index_of(self, order_id):
+        """Devuelve el índice de una posición o -1 si no existe"""
+        hits = np.flatnonzero(self.order_ids[:self.count] == order_id)
+        return int(hits[0]) if hits.size else -1
+    
+    def row(self, index):
+        """Devuelve la posición del índice indicado como Order"""
+        activated = bool(self.trailing_activated[index])
+        return Order(
+            price=float(self.entry_prices[index]),
+            quantity=float(self.quantities[index]),
+            side='BUY' if self.sides[index] == 1 else 'SELL',
+            take_profit=float(self.take_profits[index]),
+            stop_loss=float(self.stop_losses[index]),
+            status='FILLED',
+            trailing_stop_activated=activated,
+            trailing_stop_price=float(self.trailing_prices[index]) if activated else None
+        )
+    
+    def remove(self, index):
+        """Elimina una posición moviendo la última a su hueco para mantener las columnas compactas"""
+        last = self.count - 1
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            column[index] = column[last]
+        self.count = last
+
 class GridTradingBotOptimized:
     """
     Bot de trading optimizado que implementa la estrategia de Grid Trading Adaptativo
@@ -38,6 +157,8 @@ class GridTradingBotOptimized:
         
         # Parámetros de trading
         self.symbol = config.TRADING_SYMBOL
+        # Activo base del par (p. ej. BTC en BTCUSDT), calculado una sola vez para logs y balances
+        self._base_asset = self.symbol[:-4] if self.symbol.endswith("USDT") else self.symbol.replace("USDT", "")
         self.investment_amount = config.INVESTMENT_AMOUNT
         self.take_profit_percent = config.TAKE_PROFIT_PERCENT
         self.stop_loss_percent = config.STOP_LOSS_PERCENT
@@ -48,57 +169,290 @@ class GridTradingBotOptimized:
         self.grid_levels = config.GRID_LEVELS
         self.grid_spacing_percent = config.GRID_SPACING_PERCENT
         
+        # Peso del tamaño de orden de cada nivel según su distancia al nivel central
+        # (órdenes más pequeñas en los extremos; optimizado: factor base reducido); solo depende de grid_levels
+        levels = np.arange(self.grid_levels)
+        distance_factor = 1 - np.abs(levels - (self.grid_levels - 1) / 2) / (self.grid_levels - 1)
+        self._size_weights = 0.4 + 0.6 * distance_factor
+        
         # Parámetros de gestión de riesgos optimizados
         self.trailing_stop_percent = config.TRAILING_STOP_PERCENT
         
         # Estado del bot
         self.active_orders = {}
-        self.completed_trades = []
+        # Historial de operaciones cerradas por columnas (una entrada por operación en cada array)
+        self._trades = {
+            'order_id': array('q'),
+            'entry': array('d'),
+            'exit': array('d'),
+            'qty': array('d'),
+            'pnl': array('d'),
+            'side': array('b'),    # 1 = BUY, -1 = SELL
+            'reason': array('b'),  # índice en _CLOSE_REASONS
+            'ts': array('d')       # marca de tiempo Unix
+        }
         self.daily_trades_count = 0
-        self.last_grid_update = datetime.now()
+        self.last_grid_update = datetime.now()  # Solo para registro
+        self._last_grid_update_ts = time.monotonic()
         self.grid_prices = []
+        self._grid_prices_arr = np.empty(0)
         self.trailing_stops = {}  # Para almacenar los trailing stops de las posiciones abiertas
+        # Posiciones abiertas (órdenes ya ejecutadas) en formato columnar
+        self._positions = OrderBook()
         
-        logger.info(f"Bot optimizado inicializado para {self.symbol} con {self.grid_levels} niveles")
-        logger.info(f"Parámetros optimizados: Espaciado={self.grid_spacing_percent}%, TP={self.take_profit_percent}%, SL={self.stop_loss_percent}%")
+        # Reglas del mercado en caché (se refrescan cada hora)
+        self._step_size = None
+        self._tick_size = None
+        self._precision = None
+        self._symbol_info_update = None
+        
+        # Estado alimentado por los streams WebSocket (bookTicker y datos de usuario)
+        self._ws_manager = None
+        self._price_lock = threading.Lock()
+        self._last_price = None
+        self._last_price_time = 0.0
+        self._balances = {}
+        self._order_events = queue.Queue()
+        
+        # Cierres horarios de los últimos 30 días, sembrados una vez por REST y mantenidos por el stream de velas
+        # (o, sin stream, completados por REST con las velas cerradas desde la última del búfer)
+        self._closes = deque(maxlen=24 * 30)
+        self._closes_last_open_ms = 0  # Hora de apertura de la última vela del búfer
+        self._closes_lock = threading.Lock()
+        # Despierta el bucle principal ante una ejecución o un movimiento de precio relevante
+        self._wake = threading.Event()
+        self._last_checked_price = None
+        
+        # Pool de hilos para enviar las órdenes de la cuadrícula en paralelo, con conexiones keep-alive
+        # suficientes para que cada petición reutilice un socket TLS del pool
+        self._order_executor = ThreadPoolExecutor(max_workers=self.grid_levels)
+        self.client.session.mount("https://", HTTPAdapter(pool_maxsize=self.grid_levels))
+        
+        logger.info("Bot optimizado inicializado para %s con %d niveles", self.symbol, self.grid_levels)
+        logger.info("Parámetros optimizados: Espaciado=%s%%, TP=%s%%, SL=%s%%",
+                    self.grid_spacing_percent, self.take_profit_percent, self.stop_loss_percent)
+    
+    def start_streams(self):
+        """Inicia los streams WebSocket de bookTicker y de datos de usuario para evitar el polling REST"""
+        if self._ws_manager:
+            return True
+        try:
+            self._ws_manager = ThreadedWebsocketManager(
+                api_key=config.TESTNET_API_KEY,
+                api_secret=config.TESTNET_API_SECRET,
+                testnet=True
+            )
+            self._ws_manager.start()
+            self._ws_manager.start_symbol_book_ticker_socket(callback=self._handle_book_ticker_event, symbol=self.symbol)
+            self._ws_manager.start_user_socket(callback=self._handle_user_event)
+            self._ws_manager.start_kline_socket(callback=self._handle_kline_event, symbol=self.symbol, interval=_K1H)
+            logger.info("Streams WebSocket iniciados para %s", self.symbol)
+            return True
+        except Exception as e:
+            logger.error("Error al iniciar streams WebSocket, se usará REST: %s", e)
+            self._ws_manager = None
+            return False
+    
+    def stop_streams(self):
+        """Detiene los streams WebSocket"""
+        if self._ws_manager:
+            self._ws_manager.stop()
+            self._ws_manager = None
+            with self._price_lock:
+                self._last_price = None
+            self._balances = {}
+            with self._closes_lock:
+                self._closes.clear()
+            logger.info("Streams WebSocket detenidos")
     
-    def get_account_balance(self, asset="USDT"):
-        """Obtiene el balance disponible de un activo específico"""
+    def _handle_book_ticker_event(self, msg):
+        """Actualiza el último precio (punto medio entre mejor bid y mejor ask) desde el stream <symbol>@bookTicker"""
+        if msg.get('e') == 'error':
+            logger.error("Error en el stream de bookTicker: %s", msg)
+            return
+        price = (float(msg['b']) + float(msg['a'])) / 2
+        with self._price_lock:
+            self._last_price = price
+            self._last_price_time = time.monotonic()
+        # Despertar al bucle si el precio se ha movido lo suficiente desde la última comprobación de stops
+        last_checked = self._last_checked_price
+        if last_checked and abs(price - last_checked) / last_checked * 100 >= config.WAKE_PRICE_MOVE_PERCENT:
+            self._wake.set()
+    
+    def _handle_user_event(self, msg):
+        """Actualiza balances y encola los executionReport del símbolo desde el stream de usuario"""
+        if msg.get('e') == 'error':
+            logger.error("Error en el stream de usuario: %s", msg)
+        elif msg.get('e') == 'outboundAccountPosition':
+            for balance in msg['B']:
+                self._balances[balance['a']] = float(balance['f'])
+        elif msg.get('e') == 'executionReport' and msg['s'] == self.symbol:
+            # El bucle principal aplica los eventos, así active_orders solo se modifica desde un hilo
+            self._order_events.put(msg)
+            self._wake.set()
+    
+    def _handle_kline_event(self, msg):
+        """Añade al búfer de cierres cada vela horaria cerrada del stream <symbol>@kline_1h"""
+        if msg.get('e') == 'error':
+            logger.error("Error en el stream de velas: %s", msg)
+            return
+        if msg['k']['x']:
+            with self._closes_lock:
+                # Hasta que el búfer se siembre por REST, las velas sueltas no forman una ventana continua
+                if self._closes:
+                    self._closes.append(float(msg['k']['c']))
+                    self._closes_last_open_ms = msg['k']['t']
+    
+    def _seed_closes(self):
+        """
+        Carga en el búfer los cierres horarios desde la API REST: la primera vez (o si el búfer ha quedado
+        más antiguo que su ventana) los de los últimos 30 días, y después solo las velas cerradas desde la última
+        """
+        now_ms = time.time() * 1000
+        if self._closes and now_ms - self._closes_last_open_ms < self._closes.maxlen * _K1H_MS:
+            klines = self.client.get_klines(symbol=self.symbol, interval=_K1H,
+                                            startTime=self._closes_last_open_ms + 1, limit=1000)
+        else:
+            self._closes.clear()
+            klines = self.client.get_historical_klines(self.symbol, _K1H, "30 days ago UTC")
+        # La última vela sigue abierta si su hora de cierre aún no ha llegado: se descarta, porque su cierre
+        # definitivo llegará después (por el stream o en la siguiente recarga) y la hora contaría dos veces
+        if klines and klines[-1][6] > now_ms:
+            klines = klines[:-1]
+        if klines:
+            self._closes.extend(float(kline[4]) for kline in klines)  # Precio de cierre
+            self._closes_last_open_ms = klines[-1][0]
+    
+    def _apply_order_events(self):
+        """Aplica a active_orders los cambios de estado recibidos por el stream de usuario"""
+        while True:
+            try:
+                report = self._order_events.get_nowait()
+            except queue.Empty:
+                break
+            
+            order_data = self.active_orders.get(report['i'])
+            if order_data is None:
+                continue
+            if report['X'] == 'FILLED':
+                # La orden pasa a ser una posición abierta
+                del self.active_orders[report['i']]
+                self._positions.add(report['i'], order_data)
+                logger.info("Orden ejecutada: %s (%s %s a %s)", report['i'], report['S'], report['z'], report['L'])
+            elif report['X'] in ('CANCELED', 'EXPIRED', 'REJECTED'):
+                del self.active_orders[report['i']]
+            else:
+                order_data.status = report['X']
+    
+    def wait_for_events(self, timeout):
+        """Espera a una ejecución, a un movimiento de precio relevante o a que venza el timeout; devuelve True si hubo eventos"""
+        woken = self._wake.wait(timeout)
+        self._wake.clear()
+        return woken
+    
+    def wake(self):
+        """Despierta el bucle principal de inmediato (por ejemplo, para detenerlo)"""
+        self._wake.set()
+    
+    @property
+    def completed_trades(self):
+        """Operaciones cerradas como lista de diccionarios (vista construida a partir del historial columnar)"""
+        trades = self._trades
+        return [
+            {
+                'order_id': trades['order_id'][i],
+                'entry_price': trades['entry'][i],
+                'exit_price': trades['exit'][i],
+                'quantity': trades['qty'][i],
+                'side': 'BUY' if trades['side'][i] == 1 else 'SELL',
+                'pnl': trades['pnl'][i],
+                'reason': _CLOSE_REASONS[trades['reason'][i]],
+                'timestamp': datetime.fromtimestamp(trades['ts'][i]).isoformat()
+            }
+            for i in range(len(trades['pnl']))
+        ]
+    
+    def get_trade_stats(self):
+        """Devuelve número de operaciones, PnL total y tasa de acierto calculados sobre las columnas del historial"""
+        pnl = np.frombuffer(self._trades['pnl'], dtype=np.float64)
+        if pnl.size == 0:
+            return {'trades': 0, 'total_pnl': 0.0, 'win_rate': 0.0}
+        return {
+            'trades': int(pnl.size),
+            'total_pnl': float(pnl.sum()),
+            'win_rate': float(np.count_nonzero(pnl > 0)) / pnl.size * 100
+        }
+    
+    @property
+    def balances_streaming(self):
+        """Indica si los balances se reciben por el stream de usuario (sin consultas REST)"""
+        return self._ws_manager is not None and bool(self._balances)
+    
+    def get_account_balance(self, asset="USDT", account_info=None):
+        """
+        Obtiene el balance disponible de un activo específico. Si no está en la caché del stream,
+        se usa account_info (respuesta de get_account ya obtenida) o se consulta la cuenta.
+        """
+        if self._ws_manager and asset in self._balances:
+            return self._balances[asset]
         try:
-            account_info = self.client.get_account()
-            for balance in account_info['balances']:
-                if balance['asset'] == asset:
-                    return float(balance['free'])
-            return 0.0
+            if account_info is None:
+                account_info = self.client.get_account()
+            balances = {balance['asset']: float(balance['free']) for balance in account_info['balances']}
+            if self._ws_manager:
+                # Sembrar la caché; a partir de aquí el stream de usuario la mantiene actualizada
+                self._balances = balances
+                self._balances.setdefault(asset, 0.0)
+            return balances.get(asset, 0.0)
         except BinanceAPIException as e:
-            logger.error(f"Error al obtener balance: {e}")
+            logger.error("Error al obtener balance: %s", e)
             return 0.0
     
     def get_current_price(self):
         """Obtiene el precio actual del par de trading"""
+        with self._price_lock:
+            if self._last_price is not None and time.monotonic() - self._last_price_time < config.STREAM_MAX_PRICE_AGE:
+                return self._last_price
         try:
             ticker = self.client.get_symbol_ticker(symbol=self.symbol)
-            return float(ticker['price'])
+            price = float(ticker['price'])
+            # Guardar también el precio REST, para que las demás consultas de la misma iteración
+            # (should_update_grid, check_completed_orders, estado) no repitan la petición
+            with self._price_lock:
+                self._last_price = price
+                self._last_price_time = time.monotonic()
+            return price
         except BinanceAPIException as e:
-            logger.error(f"Error al obtener precio: {e}")
+            logger.error("Error al obtener precio: %s", e)
             return None
     
+    def _get_symbol_filters(self):
+        """Obtiene (step_size, tick_size) de los filtros LOT_SIZE y PRICE_FILTER, consultando la API como máximo una vez por hora"""
+        if self._step_size is None or time.monotonic() - self._symbol_info_update >= 3600:
+            info = self.client.get_symbol_info(self.symbol)
+            filters = {f['filterType']: f for f in info['filters']}
+            self._step_size = float(filters['LOT_SIZE']['stepSize'])
+            self._tick_size = float(filters['PRICE_FILTER']['tickSize'])
+            self._precision = _step_decimals(self._step_size)
+            self._symbol_info_update = time.monotonic()
+        return self._step_size, self._tick_size
+    
     def calculate_grid_prices(self):
         """Calcula los precios de la cuadrícula basados en el precio actual y la volatilidad"""
         current_price = self.get_current_price()
         if not current_price:
             return False
         
-        # Obtener datos históricos para calcular la volatilidad
-        klines = self.client.get_historical_klines(
-            self.symbol, Client.KLINE_INTERVAL_1HOUR, "1 day ago UTC"
-        )
+        # Cierres horarios para la volatilidad: con el stream de velas activo el búfer se mantiene solo;
+        # si no, se completa por REST con las velas cerradas desde la última consulta
+        with self._closes_lock:
+            if not self._ws_manager or not self._closes:
+                self._seed_closes()
+            closes = np.fromiter(self._closes, dtype=np.float64, count=len(self._closes))
         
-        # Calcular la volatilidad (desviación estándar de los precios)
-        prices = [float(kline[4]) for kline in klines]  # Precio de cierre
-        avg_price = sum(prices) / len(prices)
-        variance = sum([(p - avg_price) ** 2 for p in prices]) / len(prices)
-        volatility = math.sqrt(variance) / avg_price * 100  # Volatilidad en porcentaje
+        # Calcular la volatilidad como desviación estándar de los rendimientos logarítmicos
+        returns = np.diff(np.log(closes))
+        volatility = float(returns.std(ddof=1)) * 100  # Volatilidad en porcentaje
         
         # Ajustar el espaciado de la cuadrícula según la volatilidad
         # Más volatilidad = mayor espaciado, pero con un límite inferior optimizado
@@ -111,22 +465,17 @@ class GridTradingBotOptimized:
         
         # Crear la cuadrícula de precios con distribución no lineal (optimizado)
         # Más niveles cerca del precio actual para mayor precisión
-        self.grid_prices = []
-        for i in range(self.grid_levels):
-            # Distribución no lineal para concentrar niveles cerca del precio actual
-            power = 3  # Factor de no linealidad
-            normalized_position = ((i / (self.grid_levels - 1)) * 2 - 1) ** power  # Entre -1 y 1, con concentración en el centro
-            level_position = (normalized_position + 1) / 2  # Entre 0 y 1
-            
-            level_price = lower_limit + (upper_limit - lower_limit) * level_position
-            self.grid_prices.append(round(level_price, 2))
-        
-        # Ordenar los precios para asegurar que estén en orden ascendente
-        self.grid_prices.sort()
+        power = 3  # Factor de no linealidad
+        normalized_position = np.linspace(-1, 1, self.grid_levels) ** power  # Entre -1 y 1, con concentración en el centro
+        level_position = (normalized_position + 1) / 2  # Entre 0 y 1
+        # La potencia impar es monótona, así que los precios ya salen en orden ascendente
+        self._grid_prices_arr = np.round(lower_limit + (upper_limit - lower_limit) * level_position, 2)
+        self.grid_prices = self._grid_prices_arr.tolist()
         
         self.last_grid_update = datetime.now()
-        logger.info(f"Cuadrícula optimizada actualizada: {self.grid_prices}")
-        logger.info(f"Volatilidad: {volatility:.2f}%, Espaciado ajustado: {adjusted_spacing:.2f}%")
+        self._last_grid_update_ts = time.monotonic()
+        logger.info("Cuadrícula optimizada actualizada: %s", self.grid_prices)
+        logger.info("Volatilidad: %.2f%%, Espaciado ajustado: %.2f%%", volatility, adjusted_spacing)
         return True
     
     def place_grid_orders(self):
@@ -146,203 +495,203 @@ class GridTradingBotOptimized:
         usdt_balance = self.get_account_balance("USDT")
         order_size_usdt = min(self.investment_amount, usdt_balance * self.risk_percentage / 100)
         
-        # Colocar nuevas órdenes en cada nivel de la cuadrícula
-        for i, price in enumerate(self.grid_prices):
-            try:
-                # Ajustar el tamaño de la orden según la distancia desde el precio medio
-                # Órdenes más pequeñas en los extremos (optimizado: distribución más agresiva)
-                distance_factor = 1 - abs(i - (self.grid_levels - 1) / 2) / (self.grid_levels - 1)
-                adjusted_order_size = order_size_usdt * (0.4 + 0.6 * distance_factor)  # Optimizado: factor base reducido
-                
-                # Calcular la cantidad en la moneda base (BTC)
-                quantity = adjusted_order_size / price
-                
-                # Redondear la cantidad según las reglas del mercado
-                info = self.client.get_symbol_info(self.symbol)
-                lot_size_filter = next(filter(lambda x: x['filterType'] == 'LOT_SIZE', info['filters']))
-                step_size = float(lot_size_filter['stepSize'])
-                quantity = self.round_step_size(quantity, step_size)
+        # Obtener las reglas del mercado una sola vez (en caché) en lugar de en cada nivel
+        try:
+            self._get_symbol_filters()
+        except BinanceAPIException as e:
+            logger.error("Error al obtener información del símbolo: %s", e)
+            return False
+        
+        # Toda la aritmética por nivel se calcula de una vez; el bucle solo envía las órdenes
+        prices = self._grid_prices_arr
+        is_buy = prices < current_price
+        
+        # Ajustar el tamaño de la orden según la distancia desde el precio medio y calcular la cantidad
+        # en la moneda base (BTC), redondeada según las reglas del mercado
+        quantities = self._round_qty_vec(order_size_usdt * self._size_weights / prices).tolist()
+        
+        # Calcular niveles de take profit y stop loss dinámicos (invertidos en las órdenes de venta)
+        take_profits = np.where(is_buy, prices * (1 + self.take_profit_percent / 100), prices * (1 - self.take_profit_percent / 100)).tolist()
+        stop_losses = np.where(is_buy, prices * (1 - self.stop_loss_percent / 100), prices * (1 + self.stop_loss_percent / 100)).tolist()
+        
+        # Colocar nuevas órdenes en cada nivel de la cuadrícula; las peticiones son independientes,
+        # así que se envían en paralelo en lugar de encadenar un round trip tras otro
+        list(self._order_executor.map(
+            self._place_grid_order, self.grid_prices, quantities, take_profits, stop_losses, repeat(current_price)
+        ))
+        
+        return True
+    
+    def _place_grid_order(self, price, quantity, take_profit, stop_loss, current_price):
+        """Coloca la orden de un nivel de la cuadrícula (compra por debajo del precio actual, venta por encima)"""
+        try:
+            if price < current_price:
+                # Colocar orden de compra
+                order = self.client.create_test_order(
+                    symbol=self.symbol,
+                    side=_SIDE_BUY,
+                    type=_ORDER_TYPE_LIMIT,
+                    timeInForce=_TIF_GTC,
+                    quantity=quantity,
+                    price=price
+                )
+                logger.debug("Orden de compra colocada en %s: %s %s", price, quantity, self._base_asset)
+                logger.debug("Take profit: %s, Stop loss: %s", take_profit, stop_loss)
                 
-                # Calcular niveles de take profit y stop loss dinámicos
-                take_profit = price * (1 + self.take_profit_percent / 100)
-                stop_loss = price * (1 - self.stop_loss_percent / 100)
+                # En un entorno real, usaríamos:
+                # order = self.client.create_order(...)
+                # self.active_orders[order['orderId']] = Order(
+                #     price=price,
+                #     quantity=quantity,
+                #     side='BUY',
+                #     take_profit=take_profit,
+                #     stop_loss=stop_loss
+                # )
                 
-                if price < current_price:
-                    # Colocar orden de compra
-                    order = self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=Client.SIDE_BUY,
-                        type=Client.ORDER_TYPE_LIMIT,
-                        timeInForce=Client.TIME_IN_FORCE_GTC,
-                        quantity=quantity,
-                        price=price
-                    )
-                    logger.info(f"Orden de compra colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
-                    logger.info(f"Take profit: {take_profit}, Stop loss: {stop_loss}")
-                    
-                    # En un entorno real, usaríamos:
-                    # order = self.client.create_order(...)
-                    # self.active_orders[order['orderId']] = {
-                    #     'price': price,
-                    #     'quantity': quantity,
-                    #     'side': 'BUY',
-                    #     'status': 'NEW',
-                    #     'take_profit': take_profit,
-                    #     'stop_loss': stop_loss,
-                    #     'trailing_stop_activated': False,
-                    #     'trailing_stop_price': None
-                    # }
-                    
-                else:
-                    # Colocar orden de venta
-                    order = self.client.create_test_order(
-                        symbol=self.symbol,
-                        side=Client.SIDE_SELL,
-                        type=Client.ORDER_TYPE_LIMIT,
-                        timeInForce=Client.TIME_IN_FORCE_GTC,
-                        quantity=quantity,
-                        price=price
-                    )
-                    logger.info(f"Orden de venta colocada en {price}: {quantity} {self.symbol.replace('USDT', '')}")
-                    logger.info(f"Take profit: {price * (1 - self.take_profit_percent / 100)}, Stop loss: {price * (1 + self.stop_loss_percent / 100)}")
-                    
-                    # En un entorno real, usaríamos:
-                    # order = self.client.create_order(...)
-                    # self.active_orders[order['orderId']] = {
-                    #     'price': price,
-                    #     'quantity': quantity,
-                    #     'side': 'SELL',
-                    #     'status': 'NEW',
-                    #     'take_profit': price * (1 - self.take_profit_percent / 100),
-                    #     'stop_loss': price * (1 + self.stop_loss_percent / 100),
-                    #     'trailing_stop_activated': False,
-                    #     'trailing_stop_price': None
-                    # }
+            else:
+                # Colocar orden de venta
+                order = self.client.create_test_order(
+                    symbol=self.symbol,
+                    side=_SIDE_SELL,
+                    type=_ORDER_TYPE_LIMIT,
+                    timeInForce=_TIF_GTC,
+                    quantity=quantity,
+                    price=price
+                )
+                logger.debug("Orden de venta colocada en %s: %s %s", price, quantity, self._base_asset)
+                logger.debug("Take profit: %s, Stop loss: %s", take_profit, stop_loss)
                 
-            except BinanceAPIException as e:
-                logger.error(f"Error al colocar orden en nivel {price}: {e}")
-        
-        return True
+                # En un entorno real, usaríamos:
+                # order = self.client.create_order(...)
+                # self.active_orders[order['orderId']] = Order(
+                #     price=price,
+                #     quantity=quantity,
+                #     side='SELL',
+                #     take_profit=take_profit,
+                #     stop_loss=stop_loss
+                # )
+            
+        except BinanceAPIException as e:
+            logger.error("Error al colocar orden en nivel %s: %s", price, e)
     
-    def round_step_size(self, quantity, step_size):
-        """Redondea la cantidad al step_size más cercano"""
-        precision = int(round(-math.log10(step_size)))
-        return round(quantity - (quantity % step_size), precision)
+    def _round_qty_vec(self, quantities):
+        """Redondea hacia abajo un array de cantidades al step_size en caché, con la precisión precalculada"""
+        # El épsilon absorbe errores de representación como 0.3 / 0.1 = 2.9999...
+        return np.round(np.floor(quantities / self._step_size + 1e-9) * self._step_size, self._precision)
     
     def cancel_all_orders(self):
         """Cancela todas las órdenes activas"""
         try:
-            orders = self.client.get_open_orders(symbol=self.symbol)
-            for order in orders:
-                self.client.cancel_order(
-                    symbol=self.symbol,
-                    orderId=order['orderId']
-                )
-                logger.info(f"Orden cancelada: {order['orderId']}")
+            # Una sola petición (DELETE /api/v3/openOrders) en lugar de una por orden
+            cancelled = self.client.cancel_all_open_orders(symbol=self.symbol)
+            logger.info("Órdenes canceladas: %s", [order['orderId'] for order in cancelled if 'orderId' in order])
             
             self.active_orders = {}
             return True
         except BinanceAPIException as e:
-            logger.error(f"Error al cancelar órdenes: {e}")
+            if e.code == -2011:
+                # Binance responde "Unknown order sent" cuando no hay órdenes abiertas
+                self.active_orders = {}
+                return True
+            logger.error("Error al cancelar órdenes: %s", e)
             return False
     
     def update_trailing_stops(self, current_price):
         """Actualiza los trailing stops para las posiciones abiertas"""
-        for order_id, order_data in self.active_orders.items():
-            if order_data['status'] == 'FILLED':
-                # Solo para órdenes ya ejecutadas
-                if order_data['side'] == 'BUY':
-                    # Para posiciones largas
-                    if not order_data['trailing_stop_activated']:
-                        # Activar trailing stop cuando el precio alcanza un cierto nivel
-                        activation_price = order_data['price'] * (1 + self.take_profit_percent / 200)  # 50% del take profit
-                        if current_price >= activation_price:
-                            order_data['trailing_stop_activated'] = True
-                            order_data['trailing_stop_price'] = current_price * (1 - self.trailing_stop_percent / 100)
-                            logger.info(f"Trailing stop activado para orden {order_id} en {order_data['trailing_stop_price']}")
-                    else:
-                        # Actualizar trailing stop si el precio sube
-                        new_stop_price = current_price * (1 - self.trailing_stop_percent / 100)
-                        if new_stop_price > order_data['trailing_stop_price']:
-                            order_data['trailing_stop_price'] = new_stop_price
-                            logger.info(f"Trailing stop actualizado para orden {order_id} en {new_stop_price}")
-                
-                elif order_data['side'] == 'SELL':
-                    # Para posiciones cortas
-                    if not order_data['trailing_stop_activated']:
-                        activation_price = order_data['price'] * (1 - self.take_profit_percent / 200)
-                        if current_price <= activation_price:
-                            order_data['trailing_stop_activated'] = True
-                            order_data['trailing_stop_price'] = current_price * (1 + self.trailing_stop_percent / 100)
-                            logger.info(f"Trailing stop activado para orden {order_id} en {order_data['trailing_stop_price']}")
-                    else:
-                        new_stop_price = current_price * (1 + self.trailing_stop_percent / 100)
-                        if new_stop_price < order_data['trailing_stop_price']:
-                            order_data['trailing_stop_price'] = new_stop_price
-                            logger.info(f"Trailing stop actualizado para orden {order_id} en {new_stop_price}")
+        book = self._positions
+        n = book.count
+        if n == 0:
+            return
+        is_buy = book.sides[:n] == 1
+        entry_prices = book.entry_prices[:n]
+        trailing_prices = book.trailing_prices[:n]
+        activated = book.trailing_activated[:n]
+        
+        # Activar trailing stop cuando el precio alcanza el 50% del take profit
+        # (por encima de la entrada en largos, por debajo en cortos)
+        reached = np.where(is_buy,
+                           current_price >= entry_prices * (1 + self.take_profit_percent / 200),
+                           current_price <= entry_prices * (1 - self.take_profit_percent / 200))
+        new_stop_prices = np.where(is_buy,
+                                   current_price * (1 - self.trailing_stop_percent / 100),
+                                   current_price * (1 + self.trailing_stop_percent / 100))
+        newly_activated = ~activated & reached
+        # Actualizar el trailing stop si el precio se mueve a favor (sube en largos, baja en cortos)
+        improved = activated & np.where(is_buy, new_stop_prices > trailing_prices, new_stop_prices < trailing_prices)
+        
+        # Las columnas son vistas del libro: se actualizan en su sitio
+        trailing_prices[newly_activated | improved] = new_stop_prices[newly_activated | improved]
+        activated |= newly_activated
+        
+        for i in np.flatnonzero(newly_activated):
+            logger.info("Trailing stop activado para orden %d en %s", book.order_ids[i], trailing_prices[i])
+        for i in np.flatnonzero(improved):
+            logger.info("Trailing stop actualizado para orden %d en %s", book.order_ids[i], trailing_prices[i])
     
     def check_trailing_stops(self, current_price):
         """Verifica si algún trailing stop ha sido alcanzado"""
-        orders_to_close = []
-        
-        for order_id, order_data in self.active_orders.items():
-            if order_data['status'] == 'FILLED' and order_data['trailing_stop_activated']:
-                if order_data['side'] == 'BUY' and current_price <= order_data['trailing_stop_price']:
-                    # Cerrar posición larga
-                    logger.info(f"Trailing stop alcanzado para orden {order_id} en {current_price}")
-                    orders_to_close.append((order_id, order_data))
-                
-                elif order_data['side'] == 'SELL' and current_price >= order_data['trailing_stop_price']:
-                    # Cerrar posición corta
-                    logger.info(f"Trailing stop alcanzado para orden {order_id} en {current_price}")
-                    orders_to_close.append((order_id, order_data))
-        
-        # Cerrar las posiciones que alcanzaron el trailing stop
-        for order_id, order_data in orders_to_close:
-            self.close_position(order_id, order_data, current_price, 'TRAILING_STOP')
+        book = self._positions
+        n = book.count
+        # Largos: el precio cae por debajo del trailing stop; cortos: sube por encima
+        hits = book.trailing_activated[:n] & np.where(book.sides[:n] == 1,
+                                                      current_price <= book.trailing_prices[:n],
+                                                      current_price >= book.trailing_prices[:n])
+        # Cerrar las posiciones que alcanzaron el trailing stop. Se recorren de mayor a menor índice:
+        # al eliminar una fila se mueve la última a su hueco, y las filas pendientes quedan por debajo
+        for i in np.flatnonzero(hits)[::-1]:
+            logger.info("Trailing stop alcanzado para orden %d en %s", book.order_ids[i], current_price)
+            self.close_position(int(book.order_ids[i]), book.row(i), current_price, 'TRAILING_STOP')
     
     def close_position(self, order_id, order_data, current_price, reason):
         """Cierra una posición abierta"""
         try:
-            side = Client.SIDE_SELL if order_data['side'] == 'BUY' else Client.SIDE_BUY
+            side = _SIDE_SELL if order_data.side == 'BUY' else _SIDE_BUY
             
             # En un entorno real, usaríamos:
             # close_order = self.client.create_order(
             #     symbol=self.symbol,
             #     side=side,
             #     type=Client.ORDER_TYPE_MARKET,
-            #     quantity=order_data['quantity']
+            #     quantity=order_data.quantity
             # )
             
             # Calcular PnL
-            if order_data['side'] == 'BUY':
-                pnl = (current_price - order_data['price']) * order_data['quantity']
+            if order_data.side == 'BUY':
+                pnl = (current_price - order_data.price) * order_data.quantity
             else:
-                pnl = (order_data['price'] - current_price) * order_data['quantity']
+                pnl = (order_data.price - current_price) * order_data.quantity
             
-            # Registrar operación completada
-            trade_data = {
-                'order_id': order_id,
-                'entry_price': order_data['price'],
-                'exit_price': current_price,
-                'quantity': order_data['quantity'],
-                'side': order_data['side'],
-                'pnl': pnl,
-                'reason': reason,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            self.completed_trades.append(trade_data)
+            # Registrar operación completada (un valor por columna)
+            trades = self._trades
+            trades['order_id'].append(order_id)
+            trades['entry'].append(order_data.price)
+            trades['exit'].append(current_price)
+            trades['qty'].append(order_data.quantity)
+            trades['pnl'].append(pnl)
+            trades['side'].append(1 if order_data.side == 'BUY' else -1)
+            trades['reason'].append(_CLOSE_REASONS.index(reason))
+            trades['ts'].append(time.time())
             self.daily_trades_count += 1
             
-            # Eliminar de órdenes activas
-            del self.active_orders[order_id]
+            # Eliminar de las posiciones abiertas
+            index = self._positions.index_of(order_id)
+            if index >= 0:
+                self._positions.remove(index)
             
-            logger.info(f"Posición cerrada: {trade_data}")
+            # Mismo formato de diccionario que analizan las herramientas de prueba a partir del log
+            logger.info("Posición cerrada: %s", {
+                'order_id': order_id,
+                'entry_price': order_data.price,
+                'exit_price': current_price,
+                'quantity': order_data.quantity,
+                'side': order_data.side,
+                'pnl': pnl,
+                'reason': reason
+            })
             return True
             
         except Exception as e:
-            logger.error(f"Error al cerrar posición: {e}")
+            logger.error("Error al cerrar posición: %s", e)
             return False
     
     def check_completed_orders(self):
@@ -352,54 +701,53 @@ class GridTradingBotOptimized:
             # y actualizaríamos self.completed_trades y self.daily_trades_count
             
             # Simulación para testnet
-            logger.info("Verificando órdenes completadas (simulación)")
+            logger.debug("Verificando órdenes completadas (simulación)")
+            
+            # Incorporar las ejecuciones notificadas por el stream de usuario
+            self._apply_order_events()
             
             # Verificar take profit y stop loss para órdenes simuladas
             current_price = self.get_current_price()
             if current_price:
+                self._last_checked_price = current_price
+                
                 # Actualizar trailing stops
                 self.update_trailing_stops(current_price)
                 
                 # Verificar si algún trailing stop ha sido alcanzado
                 self.check_trailing_stops(current_price)
                 
-                # Verificar take profit y stop loss
-                for order_id, order_data in list(self.active_orders.items()):
-                    if order_data['status'] == 'FILLED':
-                        if order_data['side'] == 'BUY':
-                            # Verificar take profit para posiciones largas
-                            if current_price >= order_data['take_profit']:
-                                self.close_position(order_id, order_data, current_price, 'TAKE_PROFIT')
-                            # Verificar stop loss para posiciones largas
-                            elif current_price <= order_data['stop_loss']:
-                                self.close_position(order_id, order_data, current_price, 'STOP_LOSS')
-                        
-                        elif order_data['side'] == 'SELL':
-                            # Verificar take profit para posiciones cortas
-                            if current_price <= order_data['take_profit']:
-                                self.close_position(order_id, order_data, current_price, 'TAKE_PROFIT')
-                            # Verificar stop loss para posiciones cortas
-                            elif current_price >= order_data['stop_loss']:
-                                self.close_position(order_id, order_data, current_price, 'STOP_LOSS')
+                # Verificar take profit y stop loss (en cortos ambos niveles están invertidos)
+                book = self._positions
+                n = book.count
+                is_buy = book.sides[:n] == 1
+                take_profit_hits = np.where(is_buy, current_price >= book.take_profits[:n], current_price <= book.take_profits[:n])
+                stop_loss_hits = ~take_profit_hits & np.where(is_buy, current_price <= book.stop_losses[:n], current_price >= book.stop_losses[:n])
+                # Cerrar de mayor a menor índice para que la compactación del libro no desplace filas pendientes
+                for i in np.flatnonzero(take_profit_hits | stop_loss_hits)[::-1]:
+                    reason = 'TAKE_PROFIT' if take_profit_hits[i] else 'STOP_LOSS'
+                    self.close_position(int(book.order_ids[i]), book.row(i), current_price, reason)
             
             return True
         except Exception as e:
-            logger.error(f"Error al verificar órdenes completadas: {e}")
+            logger.error("Error al verificar órdenes completadas: %s", e)
             return False
     
     def should_update_grid(self):
         """Determina si es necesario actualizar la cuadrícula"""
         # Actualizar la cuadrícula si han pasado más de 12 horas (optimizado: más frecuente)
-        hours_since_update = (datetime.now() - self.last_grid_update).total_seconds() / 3600
-        if hours_since_update >= 12:
+        # Reloj monótono: inmune a ajustes del reloj del sistema (NTP, cambios de hora)
+        if time.monotonic() - self._last_grid_update_ts >= 12 * 3600:
             return True
         
         # Actualizar si el precio actual está fuera del rango de la cuadrícula
+        # (el precio sale de la caché del stream o de la última consulta REST reciente)
         if self.grid_prices:
             current_price = self.get_current_price()
             if current_price:
-                min_price = min(self.grid_prices)
-                max_price = max(self.grid_prices)
+                # La cuadrícula se construye en orden ascendente: los extremos son el primer y el último nivel
+                min_price = self.grid_prices[0]
+                max_price = self.grid_prices[-1]
                 # Optimizado: umbral más sensible para actualización
                 if current_price < min_price * 0.99 or current_price > max_price * 1.01:
                     return True
@@ -416,9 +764,11 @@ class GridTradingBotOptimized:
         logger.info("Iniciando bot de trading optimizado...")
         
         try:
+            self.start_streams()
+            
             # Verificar conexión
             server_time = self.client.get_server_time()
-            logger.info(f"Conectado a Binance. Tiempo del servidor: {server_time}")
+            logger.info("Conectado a Binance. Tiempo del servidor: %s", server_time)
             
             # Configuración inicial
             if not self.calculate_grid_prices():
@@ -438,7 +788,7 @@ class GridTradingBotOptimized:
                 
                 # Verificar si se ha alcanzado el límite diario de operaciones
                 if self.daily_trades_count >= self.max_trades_per_day:
-                    logger.info(f"Límite diario de operaciones alcanzado ({self.max_trades_per_day}). Esperando al siguiente día.")
+                    logger.info("Límite diario de operaciones alcanzado (%d). Esperando al siguiente día.", self.max_trades_per_day)
                     # En un entorno real, esperaríamos hasta el siguiente día
                     # Por ahora, simplemente reiniciamos el contador para la demostración
                     self.reset_daily_counter()
@@ -446,23 +796,26 @@ class GridTradingBotOptimized:
                 # Mostrar estado actual
                 current_price = self.get_current_price()
                 usdt_balance = self.get_account_balance("USDT")
-                btc_balance = self.get_account_balance(self.symbol.replace("USDT", ""))
+                btc_balance = self.get_account_balance(self._base_asset)
                 
-                logger.info(f"Precio actual: {current_price} USDT")
-                logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.symbol.replace('USDT', '')}: {btc_balance}")
-                logger.info(f"Operaciones hoy: {self.daily_trades_count}/{self.max_trades_per_day}")
+                logger.debug("Precio actual: %s USDT", current_price)
+                logger.debug("Balance USDT: %s", usdt_balance)
+                logger.debug("Balance %s: %s", self._base_asset, btc_balance)
+                logger.info("Operaciones hoy: %d/%d", self.daily_trades_count, self.max_trades_per_day)
                 
                 # Esperar antes de la siguiente iteración
-                logger.info(f"Esperando {config.CHECK_INTERVAL} segundos...")
-                time.sleep(config.CHECK_INTERVAL)
+                # Esperar a un evento (ejecución o movimiento de precio) o, como máximo, CHECK_INTERVAL
+                logger.debug("Esperando eventos (máximo %s segundos)...", config.CHECK_INTERVAL)
+                self.wait_for_events(config.CHECK_INTERVAL)
                 
         except KeyboardInterrupt:
             logger.info("Bot detenido manualmente.")
             self.cancel_all_orders()
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             self.cancel_all_orders()
+        finally:
+            self.stop_streams()
 
 if __name__ == "__main__":
     bot = GridTradingBotOptimized()
@@ -5,12 +5,28 @@ Script para analizar el rendimiento del bot de trading
 
 import os
 import json
+import array
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import re
 import logging
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+# Los gráficos solo se guardan como PNG: se dibujan con Agg directamente, sin el estado global de pyplot
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from datetime import datetime, timedelta
 
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el módulo json estándar
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson es opcional: sin él el historial se carga completo en memoria
+    ijson = None
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,6 +38,177 @@ logging.basicConfig(
 )
 logger = logging.getLogger("performance_analysis")
 
+# Reglas de recomendación: (métrica, umbral inferior, mensaje si queda por debajo,
+# umbral superior, mensaje si queda por encima). None indica que no hay regla en ese lado.
+_RULES = (
+    ('win_rate',
+     40, "Considerar reducir el espaciado de la cuadrícula para aumentar la frecuencia de operaciones rentables",
+     60, "El win rate es bueno. Considerar aumentar ligeramente el tamaño de las posiciones para maximizar ganancias"),
+    ('profit_factor',
+     1.2, "Ajustar los niveles de take profit para mejorar la relación beneficio/pérdida",
+     2, "Excelente profit factor. La estrategia está funcionando bien"),
+    ('max_drawdown',
+     None, None,
+     10, "Considerar implementar stop loss más estrictos para reducir el drawdown máximo"),
+    ('sharpe_ratio',
+     1, "Mejorar la consistencia de los retornos para aumentar el Sharpe Ratio",
+     2, "Excelente Sharpe Ratio. La estrategia tiene un buen equilibrio riesgo/recompensa"),
+    ('trades_per_day',
+     3, "Considerar reducir el espaciado de la cuadrícula para aumentar la frecuencia de operaciones",
+     10, "Alta frecuencia de operaciones. Verificar que las comisiones no estén afectando la rentabilidad"),
+)
+
+# Campos del historial que usan las métricas y los gráficos
+_TRADES_DTYPE = np.dtype([('ts', 'datetime64[ns]'), ('pnl', 'f8')])
+
+def _load_json_file(path):
+    """Lee un archivo JSON con orjson si está disponible"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _dump_json_file(path, obj):
+    """Escribe un objeto como JSON indentado con orjson si está disponible"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
+
+def _iter_json_lines(f):
+    """
+    Decodifica un archivo JSON Lines línea a línea. Una última línea incompleta (aún en escritura)
+    y las líneas dañadas se ignoran.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    for line in f:
+        if not line.endswith(b'\n') or not line.strip():
+            continue
+        try:
+            yield loads(line)
+        except ValueError:
+            logger.warning(f"Línea no válida en el historial de operaciones: {line[:80]!r}")
+
+def _load_trades_columns(path, json_lines=False):
+    """
+    Lee el historial de operaciones en streaming (JSON Lines, o un array JSON con ijson)
+    y lo acumula por columnas, sin construir la lista completa de diccionarios. Las columnas
+    numéricas se guardan en arrays tipados; los campos ausentes quedan como NaN/None.
+    """
+    numeric_fields = ('price', 'quantity', 'pnl')
+    columns = {}
+    count = 0
+    
+    with open(path, 'rb') as f:
+        trades = _iter_json_lines(f) if json_lines else ijson.items(f, 'item', use_float=True)
+        for trade in trades:
+            for key, value in trade.items():
+                column = columns.get(key)
+                if column is None:
+                    if key in numeric_fields:
+                        column = array.array('d', [np.nan]) * count
+                    else:
+                        column = [None] * count
+                    columns[key] = column
+                column.append(np.nan if value is None and key in numeric_fields else value)
+            count += 1
+            # Rellenar las columnas que esta operación no incluía
+            for key, column in columns.items():
+                if len(column) < count:
+                    column.append(np.nan if key in numeric_fields else None)
+    
+    return {key: np.frombuffer(column, dtype=np.float64) if isinstance(column, array.array) else column
+            for key, column in columns.items()}, count
+
+def _lttb_indices(x, y, n_out):
+    """
+    Selecciona n_out puntos de la serie (x, y) con Largest-Triangle-Three-Buckets,
+    conservando su forma visual. Devuelve los índices elegidos en orden.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    
+    # El primer y el último punto se conservan; el resto se reparte en n_out - 2 cubos
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Punto medio del cubo siguiente (el último cubo usa el punto final)
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i < n_out - 3 else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        # Elegir el punto del cubo que forma el triángulo de mayor área con el anterior y el promedio siguiente
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    
+    return indices
+
+# Cada gráfico se dibuja en una función de módulo independiente para poder ejecutarlo en otro proceso
+
+def _new_chart():
+    """Crea una figura con un único eje, asociada al canvas Agg"""
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def _save_chart(fig, ax, title, xlabel, ylabel, path):
+    """Aplica títulos y rejilla y guarda el gráfico como PNG"""
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    fig.canvas.print_png(path)
+
+def _plot_daily_bars(ax, series):
+    """Dibuja una serie indexada por día como gráfico de barras con las fechas en vertical"""
+    ax.bar(series.index.astype(str), series.to_numpy(), width=0.5)
+    ax.tick_params(axis='x', labelrotation=90)
+
+def _plot_cumulative_pnl(timestamps, pnl, path, downsample_threshold, max_points):
+    """Gráfico de PnL acumulado, reducido con LTTB si la serie es larga"""
+    # Las operaciones sin PnL (NaN) no cortan la curva: se acumulan como 0
+    cumulative_pnl = np.nancumsum(pnl)
+    if len(pnl) > downsample_threshold:
+        keep = _lttb_indices(timestamps.astype(np.int64), cumulative_pnl, max_points)
+        timestamps = timestamps[keep]
+        cumulative_pnl = cumulative_pnl[keep]
+    fig, ax = _new_chart()
+    ax.plot(timestamps, cumulative_pnl)
+    _save_chart(fig, ax, 'PnL Acumulado', 'Fecha', 'PnL (USDT)', path)
+
+def _plot_pnl_distribution(pnl, path):
+    """Gráfico de distribución de PnL por operación"""
+    fig, ax = _new_chart()
+    ax.hist(pnl, bins=20, alpha=0.7)
+    _save_chart(fig, ax, 'Distribución de PnL por Operación', 'PnL (USDT)', 'Frecuencia', path)
+
+def _plot_trades_per_day(timestamps, path):
+    """Gráfico de operaciones por día"""
+    daily_trades = pd.Series(timestamps).dt.date.value_counts(sort=False).sort_index()
+    fig, ax = _new_chart()
+    _plot_daily_bars(ax, daily_trades)
+    _save_chart(fig, ax, 'Operaciones por Día', 'Fecha', 'Número de Operaciones', path)
+
+def _plot_win_rate_by_day(timestamps, pnl, path):
+    """Gráfico de win rate por día"""
+    # Media de una máscara booleana por grupo, agregada en C en lugar de con un lambda por día
+    win_rate_by_day = pd.Series(pnl > 0).groupby(pd.Series(timestamps).dt.date).mean() * 100
+    fig, ax = _new_chart()
+    _plot_daily_bars(ax, win_rate_by_day)
+    _save_chart(fig, ax, 'Win Rate por Día (%)', 'Fecha', 'Win Rate (%)', path)
+
 class PerformanceAnalyzer:
     """
     Analizador de rendimiento para evaluar la efectividad del bot de trading
@@ -30,64 +217,150 @@ class PerformanceAnalyzer:
     def __init__(self):
         """Inicializa el analizador de rendimiento"""
         self.trades_history_file = "trades_history.json"
+        # Historial en formato JSON Lines que escribe el gestor de riesgos; tiene prioridad sobre el JSON
+        self.trades_log_file = "trades_history.jsonl"
+        # Copia binaria (timestamp, PnL) del historial cargado (trades_history.jsonl o, si no existe,
+        # trades_history.json) para no volver a decodificarlo si no ha cambiado
+        self.trades_mirror_file = "trades_history.npz"
         self.log_files = ["trading_bot.log", "risk_manager.log", "trading_system.log", "test_results.log"]
+        # Campos extraídos de cada log: nombre del campo -> texto a buscar (se conserva la última coincidencia)
+        self.log_fields = {
+            "trading_bot.log": {"grid_info": "Cuadrícula actualizada", "volatility_info": "Volatilidad"},
+            "risk_manager.log": {"balance_info": "Balance diario inicial"}
+        }
+        # Posición ya analizada de cada log y últimos valores extraídos, para leer solo lo añadido desde la última ejecución
+        self.log_parse_cache_file = ".log_parse_cache.json"
+        # Tamaño de los bloques con los que se leen los logs (de atrás hacia delante)
+        self.log_read_block_size = 1 << 20
+        # Una expresión precompilada por log que localiza en una sola pasada las líneas con alguno de sus textos
+        self._log_patterns = {
+            log_file: re.compile("^.*(?:" + "|".join(map(re.escape, fields.values())) + ").*$", re.MULTILINE)
+            for log_file, fields in self.log_fields.items()
+        }
         self.performance_metrics = {}
         self.recommendations = []
+        # Recomendaciones ya generadas, por valores de las métricas que usan las reglas
+        self._recommendations_cache = {}
+        # Historial de operaciones como array estructurado (timestamp, PnL) ordenado por timestamp,
+        # compartido por métricas y gráficos
+        self._trades_arr = None
+        # Por encima de este número de operaciones, el PnL acumulado se reduce a chart_max_points antes de dibujarlo
+        self.chart_downsample_threshold = 2000
+        self.chart_max_points = 1000
         
         logger.info("Analizador de rendimiento inicializado")
     
     def load_trades_history(self):
-        """Carga el historial de operaciones desde el archivo"""
-        if os.path.exists(self.trades_history_file):
+        """Carga el historial de operaciones como array estructurado ordenado por timestamp y lo guarda en caché"""
+        json_lines = os.path.exists(self.trades_log_file)
+        trades_file = self.trades_log_file if json_lines else self.trades_history_file
+        if os.path.exists(trades_file):
+            # La copia binaria solo vale si el historial no ha cambiado desde que se generó
+            source_stat = os.stat(trades_file)
+            source = np.array([source_stat.st_size, source_stat.st_mtime_ns], dtype=np.int64)
+            arr = self._load_trades_mirror(source)
+            if arr is not None:
+                logger.info(f"Historial de operaciones cargado: {arr.size} operaciones")
+                self._trades_arr = arr
+                return arr
+            
             try:
-                with open(self.trades_history_file, 'r') as f:
-                    trades = json.load(f)
-                logger.info(f"Historial de operaciones cargado: {len(trades)} operaciones")
-                return trades
+                if json_lines or ijson is not None:
+                    # Por columnas y en streaming: no se materializa la lista de diccionarios
+                    trades, count = _load_trades_columns(trades_file, json_lines)
+                else:
+                    trades = _load_json_file(self.trades_history_file)
+                    count = len(trades)
+                logger.info(f"Historial de operaciones cargado: {count} operaciones")
             except Exception as e:
                 logger.error(f"Error al cargar historial de operaciones: {e}")
-                return []
+                trades = []
+                source = None
         else:
             logger.warning(f"Archivo de historial de operaciones no encontrado: {self.trades_history_file}")
             # Crear un historial simulado para demostración
-            return self._create_simulated_trades()
+            trades = self._create_simulated_trades()
+            source = None
+        
+        self._trades_arr = self._build_trades_array(trades)
+        if source is not None:
+            self._save_trades_mirror(source, self._trades_arr)
+        return self._trades_arr
+    
+    def _load_trades_mirror(self, source):
+        """Carga la copia binaria del historial si corresponde al archivo actual (tamaño y mtime)"""
+        if not os.path.exists(self.trades_mirror_file):
+            return None
+        try:
+            with np.load(self.trades_mirror_file) as mirror:
+                if not np.array_equal(mirror['source'], source):
+                    return None
+                return mirror['trades']
+        except Exception as e:
+            logger.warning(f"Copia binaria del historial no válida, se leerá el historial: {e}")
+            return None
+    
+    def _save_trades_mirror(self, source, arr):
+        """Guarda la copia binaria del historial junto con el tamaño y mtime del archivo (.jsonl o .json) del que procede"""
+        try:
+            np.savez(self.trades_mirror_file, trades=arr, source=source)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la copia binaria del historial: {e}")
+    
+    def _build_trades_array(self, trades):
+        """
+        Convierte las operaciones (lista de diccionarios o columnas) en un array estructurado
+        con timestamp y PnL, ordenado por timestamp
+        """
+        if not trades:
+            return np.empty(0, dtype=_TRADES_DTYPE)
+        
+        if isinstance(trades, dict):
+            count = len(trades['timestamp'])
+            pnls = trades.get('pnl', np.full(count, np.nan))
+            timestamps = trades['timestamp']
+        else:
+            count = len(trades)
+            pnls = np.fromiter((np.nan if t.get('pnl') is None else t['pnl'] for t in trades),
+                               dtype=np.float64, count=count)
+            timestamps = [t['timestamp'] for t in trades]
+        
+        arr = np.empty(count, dtype=_TRADES_DTYPE)
+        arr['ts'] = pd.to_datetime(timestamps, format='ISO8601').values.astype('datetime64[ns]')
+        arr['pnl'] = pnls
+        return arr[np.argsort(arr['ts'], kind='stable')]
     
     def _create_simulated_trades(self):
         """Crea un historial de operaciones simulado para demostración"""
         logger.info("Creando historial de operaciones simulado para análisis")
         
         # Crear operaciones simuladas basadas en la estrategia de Grid Trading
-        simulated_trades = []
+        rng = np.random.default_rng()
+        num_trades = 50
         base_price = 83400.0
-        start_time = datetime.now() - timedelta(days=7)
+        start_time = np.datetime64(datetime.now() - timedelta(days=7), 'us')
         
-        # Simular 50 operaciones en los últimos 7 días
-        for i in range(50):
-            # Alternar entre compras y ventas
-            side = "BUY" if i % 2 == 0 else "SELL"
-            
-            # Simular precio con pequeñas variaciones
-            price_change = np.random.normal(0, 200)
-            price = base_price + price_change
-            
-            # Calcular cantidad y PnL
-            quantity = 0.01 + np.random.random() * 0.02
-            
-            # Para operaciones de compra, el PnL es negativo inicialmente
-            # Para operaciones de venta, el PnL es positivo si el precio subió
-            if side == "BUY":
-                pnl = -1 * (price * quantity * 0.001)  # Comisión simulada
-            else:
-                # Simular que algunas ventas generan beneficio y otras pérdida
-                pnl_factor = np.random.normal(1.002, 0.004)  # Media ligeramente positiva
-                pnl = (price * quantity) * (pnl_factor - 1) - (price * quantity * 0.001)
-            
-            # Crear timestamp con distribución a lo largo de los 7 días
-            days_ago = np.random.randint(0, 7)
-            hours_ago = np.random.randint(0, 24)
-            timestamp = (start_time + timedelta(days=days_ago, hours=hours_ago)).isoformat()
-            
-            trade = {
+        # Simular 50 operaciones en los últimos 7 días, alternando entre compras y ventas
+        is_sell = np.arange(num_trades) % 2 == 1
+        sides = np.where(is_sell, "SELL", "BUY")
+        
+        # Simular precio con pequeñas variaciones y la cantidad de cada operación
+        prices = base_price + rng.normal(0, 200, num_trades)
+        quantities = 0.01 + rng.random(num_trades) * 0.02
+        notional = prices * quantities
+        
+        # Las compras solo pagan la comisión simulada; las ventas generan beneficio o pérdida
+        # según un factor con media ligeramente positiva, menos la comisión
+        pnl_factors = rng.normal(1.002, 0.004, num_trades)
+        pnls = notional * np.where(is_sell, pnl_factors - 1, 0.0) - notional * 0.001
+        
+        # Timestamps distribuidos a lo largo de los 7 días
+        offsets = (rng.integers(0, 7, num_trades).astype('timedelta64[D]')
+                   + rng.integers(0, 24, num_trades).astype('timedelta64[h]'))
+        timestamps = np.datetime_as_string(start_time + offsets, unit='us')
+        
+        simulated_trades = [
+            {
                 "symbol": "BTCUSDT",
                 "side": side,
                 "price": price,
@@ -95,19 +368,80 @@ class PerformanceAnalyzer:
                 "pnl": pnl,
                 "timestamp": timestamp
             }
-            
-            simulated_trades.append(trade)
+            for side, price, quantity, pnl, timestamp in zip(
+                sides.tolist(), prices.tolist(), quantities.tolist(), pnls.tolist(), timestamps.tolist()
+            )
+        ]
         
         # Guardar el historial simulado
-        with open(self.trades_history_file, 'w') as f:
-            json.dump(simulated_trades, f, indent=2)
+        _dump_json_file(self.trades_history_file, simulated_trades)
         
         logger.info(f"Historial simulado creado con {len(simulated_trades)} operaciones")
         return simulated_trades
     
+    def _load_log_parse_cache(self):
+        """Carga la caché de análisis de logs (vacía si no existe o está dañada)"""
+        if not os.path.exists(self.log_parse_cache_file):
+            return {}
+        try:
+            with open(self.log_parse_cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Caché de análisis de logs no válida, se analizarán los logs completos: {e}")
+            return {}
+    
+    def _scan_log_backwards(self, log_file, start, size):
+        """
+        Busca la última línea de cada campo entre los bytes start y size del log, leyendo
+        bloques desde el final hacia atrás y parando en cuanto todos los campos aparecen.
+        Devuelve los campos encontrados y la posición tras la última línea completa.
+        """
+        fields = self.log_fields[log_file]
+        pattern = self._log_patterns[log_file]
+        found = {}
+        end = None
+        tail = b''
+        pos = size
+        
+        with open(log_file, 'rb') as f:
+            while pos > start and len(found) < len(fields):
+                block_start = max(start, pos - self.log_read_block_size)
+                f.seek(block_start)
+                data = f.read(pos - block_start) + tail
+                pos = block_start
+                
+                if end is None:
+                    # Solo líneas completas: una línea a medio escribir se analizará en la próxima ejecución
+                    cut = data.rfind(b'\n') + 1
+                    if cut == 0:
+                        tail = data
+                        continue
+                    end = block_start + cut
+                    data = data[:cut]
+                
+                # La primera línea del bloque puede empezar en el bloque anterior: se completa en la siguiente lectura
+                tail = b''
+                if pos > start:
+                    first_newline = data.find(b'\n') + 1
+                    tail = data[:first_newline]
+                    data = data[first_newline:]
+                
+                block_found = {}
+                for match in pattern.finditer(data.decode('utf-8', errors='replace')):
+                    line = match.group()
+                    for field, text in fields.items():
+                        if text in line:
+                            block_found[field] = line.strip()
+                # Los bloques posteriores ya leídos tienen prioridad
+                for field, line in block_found.items():
+                    found.setdefault(field, line)
+        
+        return found, start if end is None else end
+    
     def analyze_logs(self):
         """Analiza los archivos de log para extraer información relevante"""
         log_data = {}
+        cache = self._load_log_parse_cache()
         
         for log_file in self.log_files:
             if not os.path.exists(log_file):
@@ -115,82 +449,82 @@ class PerformanceAnalyzer:
                 continue
             
             try:
-                with open(log_file, 'r') as f:
-                    content = f.readlines()
+                fields = self.log_fields.get(log_file, {})
+                stat = os.stat(log_file)
+                entry = cache.get(log_file)
                 
-                # Extraer información relevante según el tipo de log
-                if log_file == "trading_bot.log":
-                    # Buscar información sobre la cuadrícula y volatilidad
-                    grid_info = None
-                    volatility_info = None
-                    
-                    for line in content:
-                        if "Cuadrícula actualizada" in line:
-                            grid_info = line.strip()
-                        if "Volatilidad" in line:
-                            volatility_info = line.strip()
-                    
-                    log_data["grid_info"] = grid_info
-                    log_data["volatility_info"] = volatility_info
+                # Empezar desde el principio si es la primera vez, si el log se ha truncado o rotado
+                # (otro inodo) o si han cambiado los campos a extraer
+                if (entry is None or stat.st_size < entry['offset'] or stat.st_ino != entry['inode']
+                        or set(entry['fields']) != set(fields)):
+                    entry = {'offset': 0, 'inode': stat.st_ino, 'fields': dict.fromkeys(fields)}
                 
-                elif log_file == "risk_manager.log":
-                    # Buscar información sobre balance inicial
-                    balance_info = None
-                    
-                    for line in content:
-                        if "Balance diario inicial" in line:
-                            balance_info = line.strip()
-                    
-                    log_data["balance_info"] = balance_info
+                # Analizar solo los bytes añadidos desde la última ejecución
+                if fields and stat.st_size > entry['offset']:
+                    found, entry['offset'] = self._scan_log_backwards(log_file, entry['offset'], stat.st_size)
+                    entry['fields'].update(found)
+                
+                cache[log_file] = entry
+                log_data.update(entry['fields'])
                 
                 logger.info(f"Archivo de log analizado: {log_file}")
             except Exception as e:
                 logger.error(f"Error al analizar archivo de log {log_file}: {e}")
         
+        try:
+            with open(self.log_parse_cache_file, 'w') as f:
+                json.dump(cache, f)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la caché de análisis de logs: {e}")
+        
         return log_data
     
-    def calculate_performance_metrics(self, trades):
-        """Calcula métricas de rendimiento basadas en el historial de operaciones"""
-        if not trades:
+    def calculate_performance_metrics(self, trades=None):
+        """Calcula métricas de rendimiento basadas en el historial de operaciones (array estructurado ordenado)"""
+        arr = self._trades_arr if trades is None else trades
+        if arr is None or arr.size == 0:
             logger.warning("No hay operaciones para calcular métricas de rendimiento")
             return {}
         
         try:
-            # Convertir a DataFrame para análisis
-            df = pd.DataFrame(trades)
-            
-            # Convertir timestamp a datetime
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            
-            # Ordenar por timestamp
-            df = df.sort_values('timestamp')
-            
-            # Calcular métricas básicas
-            total_trades = len(df)
-            profitable_trades = len(df[df['pnl'] > 0])
-            losing_trades = len(df[df['pnl'] < 0])
+            # Calcular métricas básicas sobre el array de PnL, con una sola máscara para ganancias y pérdidas
+            pnl = arr['pnl']
+            ts = arr['ts']
+            total_trades = len(pnl)
+            profit_mask = pnl > 0
+            loss_mask = pnl < 0
+            profits = pnl[profit_mask]
+            losses = pnl[loss_mask]
+            profitable_trades = profits.size
+            losing_trades = losses.size
             win_rate = profitable_trades / total_trades * 100 if total_trades > 0 else 0
             
-            # Calcular ganancias/pérdidas
-            total_pnl = df['pnl'].sum()
-            avg_profit = df[df['pnl'] > 0]['pnl'].mean() if profitable_trades > 0 else 0
-            avg_loss = df[df['pnl'] < 0]['pnl'].mean() if losing_trades > 0 else 0
+            # Calcular ganancias/pérdidas (las operaciones sin PnL, NaN, se omiten como hacía pandas con skipna)
+            total_pnl = np.nansum(pnl)
+            gross_profit = profits.sum()
+            gross_loss = losses.sum()
+            avg_profit = gross_profit / profitable_trades if profitable_trades > 0 else 0
+            avg_loss = gross_loss / losing_trades if losing_trades > 0 else 0
             
             # Calcular ratio de beneficio/pérdida
-            profit_factor = abs(df[df['pnl'] > 0]['pnl'].sum() / df[df['pnl'] < 0]['pnl'].sum()) if df[df['pnl'] < 0]['pnl'].sum() != 0 else float('inf')
+            profit_factor = abs(gross_profit / gross_loss) if gross_loss != 0 else float('inf')
             
-            # Calcular drawdown
-            df['cumulative_pnl'] = df['pnl'].cumsum()
-            df['peak'] = df['cumulative_pnl'].cummax()
-            df['drawdown'] = (df['peak'] - df['cumulative_pnl']) / df['peak'].abs() * 100
-            max_drawdown = df['drawdown'].max()
+            # Calcular drawdown (con un mínimo en el divisor para que un pico en 0 no dé inf/NaN)
+            cumulative_pnl = np.nancumsum(pnl)
+            peak = np.maximum.accumulate(cumulative_pnl)
+            drawdown = (peak - cumulative_pnl) / np.maximum(np.abs(peak), 1e-12) * 100
+            max_drawdown = np.nanmax(drawdown) if not np.isnan(drawdown).all() else np.nan
             
             # Calcular Sharpe Ratio (simplificado)
-            daily_returns = df.set_index('timestamp').resample('D')['pnl'].sum()
-            sharpe_ratio = daily_returns.mean() / daily_returns.std() * np.sqrt(365) if daily_returns.std() != 0 else 0
+            # PnL diario (incluidos los días sin operaciones) sumado por índice de día con bincount;
+            # las operaciones sin PnL pesan 0, como al sumar con pandas
+            days = ts.astype('datetime64[D]').astype(np.int64)
+            daily_returns = np.bincount(days - days.min(), weights=np.nan_to_num(pnl))
+            daily_std = daily_returns.std(ddof=1) if daily_returns.size > 1 else np.nan
+            sharpe_ratio = daily_returns.mean() / daily_std * np.sqrt(365) if daily_std != 0 else 0
             
             # Calcular operaciones por día
-            days_active = (df['timestamp'].max() - df['timestamp'].min()).days + 1
+            days_active = int((ts[-1] - ts[0]) // np.timedelta64(1, 'D')) + 1
             trades_per_day = total_trades / days_active if days_active > 0 else 0
             
             # Guardar métricas
@@ -222,105 +556,71 @@ class PerformanceAnalyzer:
             logger.warning("No hay métricas de rendimiento para generar recomendaciones")
             return []
         
-        recommendations = []
-        
-        # Analizar win rate
-        win_rate = self.performance_metrics.get('win_rate', 0)
-        if win_rate < 40:
-            recommendations.append("Considerar reducir el espaciado de la cuadrícula para aumentar la frecuencia de operaciones rentables")
-        elif win_rate > 60:
-            recommendations.append("El win rate es bueno. Considerar aumentar ligeramente el tamaño de las posiciones para maximizar ganancias")
-        
-        # Analizar profit factor
-        profit_factor = self.performance_metrics.get('profit_factor', 0)
-        if profit_factor < 1.2:
-            recommendations.append("Ajustar los niveles de take profit para mejorar la relación beneficio/pérdida")
-        elif profit_factor > 2:
-            recommendations.append("Excelente profit factor. La estrategia está funcionando bien")
-        
-        # Analizar drawdown
-        max_drawdown = self.performance_metrics.get('max_drawdown', 0)
-        if max_drawdown > 10:
-            recommendations.append("Considerar implementar stop loss más estrictos para reducir el drawdown máximo")
-        
-        # Analizar Sharpe Ratio
-        sharpe_ratio = self.performance_metrics.get('sharpe_ratio', 0)
-        if sharpe_ratio < 1:
-            recommendations.append("Mejorar la consistencia de los retornos para aumentar el Sharpe Ratio")
-        elif sharpe_ratio > 2:
-            recommendations.append("Excelente Sharpe Ratio. La estrategia tiene un buen equilibrio riesgo/recompensa")
-        
-        # Analizar frecuencia de operaciones
-        trades_per_day = self.performance_metrics.get('trades_per_day', 0)
-        if trades_per_day < 3:
-            recommendations.append("Considerar reducir el espaciado de la cuadrícula para aumentar la frecuencia de operaciones")
-        elif trades_per_day > 10:
-            recommendations.append("Alta frecuencia de operaciones. Verificar que las comisiones no estén afectando la rentabilidad")
+        key = tuple(float(self.performance_metrics.get(rule[0], 0)) for rule in _RULES)
+        recommendations = self._recommendations_cache.get(key)
+        if recommendations is None:
+            recommendations = []
+            for metric, low, low_msg, high, high_msg in _RULES:
+                value = self.performance_metrics.get(metric, 0)
+                if low is not None and value < low:
+                    recommendations.append(low_msg)
+                elif high is not None and value > high:
+                    recommendations.append(high_msg)
+            self._recommendations_cache[key] = recommendations
         
+        recommendations = list(recommendations)
         self.recommendations = recommendations
         logger.info(f"Recomendaciones generadas: {recommendations}")
         return recommendations
     
-    def generate_performance_charts(self):
-        """Genera gráficos de rendimiento basados en el historial de operaciones"""
-        trades = self.load_trades_history()
-        if not trades:
+    def _charts_cache_key(self, arr):
+        """Huella de los datos que determinan los gráficos (timestamp, PnL y parámetros de reducción)"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(arr.tobytes())
+        digest.update(f"{self.chart_downsample_threshold}:{self.chart_max_points}".encode())
+        return digest.hexdigest()
+    
+    def generate_performance_charts(self, trades=None):
+        """Genera gráficos de rendimiento basados en el historial de operaciones (array estructurado ordenado)"""
+        if trades is None:
+            trades = self._trades_arr if self._trades_arr is not None else self.load_trades_history()
+        if trades.size == 0:
             logger.warning("No hay operaciones para generar gráficos de rendimiento")
             return False
         
         try:
-            # Convertir a DataFrame para visualización
-            df = pd.DataFrame(trades)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
-            
             # Crear directorio para gráficos si no existe
             charts_dir = "performance_charts"
             os.makedirs(charts_dir, exist_ok=True)
             
-            # 1. Gráfico de PnL acumulado
-            plt.figure(figsize=(12, 6))
-            df['cumulative_pnl'] = df['pnl'].cumsum()
-            plt.plot(df['timestamp'], df['cumulative_pnl'])
-            plt.title('PnL Acumulado')
-            plt.xlabel('Fecha')
-            plt.ylabel('PnL (USDT)')
-            plt.grid(True)
-            plt.savefig(f"{charts_dir}/cumulative_pnl.png")
-            plt.close()
+            # Si los datos dibujados no han cambiado desde la última ejecución, los PNG existentes siguen valiendo
+            cache_key = self._charts_cache_key(trades)
+            cache_key_file = os.path.join(charts_dir, ".cache_key")
+            chart_files = ("cumulative_pnl.png", "pnl_distribution.png", "trades_per_day.png", "win_rate_by_day.png")
+            if (os.path.exists(cache_key_file)
+                    and all(os.path.exists(os.path.join(charts_dir, name)) for name in chart_files)):
+                with open(cache_key_file, 'r') as f:
+                    if f.read() == cache_key:
+                        logger.info(f"Gráficos de rendimiento sin cambios en el directorio: {charts_dir}")
+                        return True
             
-            # 2. Gráfico de distribución de PnL por operación
-            plt.figure(figsize=(12, 6))
-            plt.hist(df['pnl'], bins=20, alpha=0.7)
-            plt.title('Distribución de PnL por Operación')
-            plt.xlabel('PnL (USDT)')
-            plt.ylabel('Frecuencia')
-            plt.grid(True)
-            plt.savefig(f"{charts_dir}/pnl_distribution.png")
-            plt.close()
+            # Los cuatro gráficos son independientes: se dibujan en paralelo, cada uno en su propio proceso
+            timestamps = trades['ts']
+            pnl = trades['pnl']
+            with ProcessPoolExecutor(max_workers=min(len(chart_files), os.cpu_count() or 1)) as executor:
+                futures = [
+                    executor.submit(_plot_cumulative_pnl, timestamps, pnl, os.path.join(charts_dir, chart_files[0]),
+                                    self.chart_downsample_threshold, self.chart_max_points),
+                    executor.submit(_plot_pnl_distribution, pnl, os.path.join(charts_dir, chart_files[1])),
+                    executor.submit(_plot_trades_per_day, timestamps, os.path.join(charts_dir, chart_files[2])),
+                    executor.submit(_plot_win_rate_by_day, timestamps, pnl, os.path.join(charts_dir, chart_files[3]))
+                ]
+                # result() propaga la excepción de cualquier gráfico que haya fallado
+                for future in futures:
+                    future.result()
             
-            # 3. Gráfico de operaciones por día
-            daily_trades = df.groupby(df['timestamp'].dt.date).size()
-            plt.figure(figsize=(12, 6))
-            daily_trades.plot(kind='bar')
-            plt.title('Operaciones por Día')
-            plt.xlabel('Fecha')
-            plt.ylabel('Número de Operaciones')
-            plt.grid(True)
-            plt.savefig(f"{charts_dir}/trades_per_day.png")
-            plt.close()
-            
-            # 4. Gráfico de win rate por día
-            df['day'] = df['timestamp'].dt.date
-            win_rate_by_day = df.groupby('day').apply(lambda x: (x['pnl'] > 0).mean() * 100)
-            plt.figure(figsize=(12, 6))
-            win_rate_by_day.plot(kind='bar')
-            plt.title('Win Rate por Día (%)')
-            plt.xlabel('Fecha')
-            plt.ylabel('Win Rate (%)')
-            plt.grid(True)
-            plt.savefig(f"{charts_dir}/win_rate_by_day.png")
-            plt.close()
+            with open(cache_key_file, 'w') as f:
+                f.write(cache_key)
             
             logger.info(f"Gráficos de rendimiento generados en el directorio: {charts_dir}")
             return True
@@ -341,8 +641,8 @@ class PerformanceAnalyzer:
         # Generar recomendaciones
         self.generate_recommendations()
         
-        # Generar gráficos
-        self.generate_performance_charts()
+        # Generar gráficos con el mismo DataFrame, sin volver a leer el historial
+        self.generate_performance_charts(trades)
         
         # Crear informe
         report = f"""# Informe de Rendimiento del Bot de Trading
@@ -447,11 +747,7 @@ Los siguientes gráficos están disponibles en el directorio `performance_charts
         if not self.recommendations:
             return "No hay recomendaciones disponibles."
         
-        formatted = ""
-        for i, rec in enumerate(self.recommendations, 1):
-            formatted += f"{i}. {rec}\n"
-        
-        return formatted
+        return "".join(f"{i}. {rec}\n" for i, rec in enumerate(self.recommendations, 1))
 
 def main():
     """Función principal para ejecutar el análisis de rendimiento"""
@@ -6,12 +6,23 @@ Módulo de gestión de riesgos para el bot de trading
 import logging
 import json
 import os
-from datetime import datetime, timedelta
-import pandas as pd
+import math
+import time
+import threading
+from collections import deque
+from itertools import islice
+from datetime import datetime
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from binance import ThreadedWebsocketManager
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el módulo json estándar
+    orjson = None
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,6 +34,55 @@ logging.basicConfig(
 )
 logger = logging.getLogger("risk_manager")
 
+# Duración de cada intervalo de vela usado por el gestor de riesgos (ms)
+_INTERVAL_MS = {
+    Client.KLINE_INTERVAL_15MINUTE: 15 * 60 * 1000,
+    Client.KLINE_INTERVAL_1HOUR: 60 * 60 * 1000
+}
+
+def _dump_json_line(obj):
+    """Serializa un objeto como una línea JSON (bytes) con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj) + '\n').encode()
+
+_load_json = orjson.loads if orjson is not None else json.loads
+
+# Escala de punto fijo del PnL: 1 tick = 1e-8 USDT (la precisión de Binance)
+_PNL_TICKS_PER_USDT = 10 ** 8
+
+# Capacidad inicial de los arrays del historial de operaciones
+_INITIAL_TRADES_CAPACITY = 1024
+
+class _RollingStats:
+    """Media y varianza de una ventana deslizante (Welford), actualizables al añadir o quitar un valor"""
+    
+    __slots__ = ('n', 'mean', 'm2')
+    
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+    
+    def remove(self, value):
+        if self.n <= 1:
+            self.__init__()
+            return
+        old_mean = self.mean
+        self.n -= 1
+        self.mean = old_mean - (value - old_mean) / self.n
+        self.m2 = max(0.0, self.m2 - (value - old_mean) * (value - self.mean))
+    
+    def std(self):
+        """Desviación típica poblacional (como np.std); NaN si la ventana está vacía"""
+        return math.sqrt(self.m2 / self.n) if self.n else float('nan')
+
 class RiskManager:
     """
     Gestor de riesgos para el bot de trading que implementa múltiples
@@ -48,115 +108,187 @@ class RiskManager:
         self.trading_paused = False
         self.pause_reason = ""
         self.risk_metrics = {}
+        # Resultado de las comprobaciones de pausa que consultan el mercado, reutilizado durante
+        # pause_check_ttl segundos para no repetir llamadas a Binance en bucles rápidos
+        self.pause_check_ttl = 30
+        self._market_pause_reason = ""
+        self._market_checks_expire = 0.0
+        
+        # Velas recientes por (intervalo, ventana en segundos), con la volatilidad de sus retornos
+        # mantenida de forma incremental; se reutilizan hasta que cierra la vela en curso
+        self._kline_windows = {}
+        # (intervalo, ventana en segundos) de la volatilidad usada para el tamaño de posición y para la pausa
+        self._position_volatility_window = (Client.KLINE_INTERVAL_1HOUR, 24 * 3600)
+        self._pause_volatility_window = (Client.KLINE_INTERVAL_15MINUTE, 4 * 3600)
+        self._kline_lock = threading.Lock()
+        # Volatilidad EWMA de los retornos logarítmicos de las velas de la pausa, actualizada en O(1)
+        # con cada vela cerrada (alpha equivalente a las 16 velas de 15 minutos de 4 horas)
+        self._vol_alpha = 2 / (16 + 1)
+        self._ewma_mean = 0.0
+        self._ewma_var = 0.0
+        self._ewma_last_open_time = None
+        self._ewma_prev_close = None
+        # Streams de velas que mantienen esas ventanas al día sin consultar la API REST
+        self._ws_manager = None
         
         # Historial de operaciones
-        self.trades_history_file = "trades_history.json"
+        # (JSON Lines: cada operación se añade como una línea, sin reescribir el archivo)
+        self.trades_history_file = "trades_history.jsonl"
+        self.legacy_trades_history_file = "trades_history.json"
         self.trades_history = self._load_trades_history()
+        # Timestamp (ns desde epoch), PnL (en ticks) y presencia de PnL del historial en arrays
+        # paralelos ordenados por timestamp; crecen duplicando su capacidad y solo se les añaden las operaciones nuevas
+        self._ts_ns = np.empty(_INITIAL_TRADES_CAPACITY, dtype=np.int64)
+        self._pnl_ticks = np.empty(_INITIAL_TRADES_CAPACITY, dtype=np.int64)
+        self._has_pnl = np.empty(_INITIAL_TRADES_CAPACITY, dtype=bool)
+        self._n_trades = 0
+        self._trades_synced = 0
+        self._history_has_pnl = False
         
         # Inicializar balance diario
         self._initialize_daily_balance()
         
         logger.info("Gestor de riesgos inicializado")
     
-    def _initialize_daily_balance(self):
-        """Inicializa el balance diario para el seguimiento de P&L"""
+    def _initialize_daily_balance(self, account_info=None):
+        """
+        Inicializa el balance diario para el seguimiento de P&L (account_info: respuesta de
+        get_account ya obtenida; si no se indica, se consulta la cuenta)
+        """
         try:
-            account_info = self.client.get_account()
+            if account_info is None:
+                account_info = self.client.get_account()
             total_balance = 0.0
+            tickers = None
             
-            # Calcular el valor total en USDT
-            for balance in account_info['balances']:
-                if float(balance['free']) > 0 or float(balance['locked']) > 0:
-                    asset = balance['asset']
-                    free_amount = float(balance['free'])
-                    locked_amount = float(balance['locked'])
-                    total_amount = free_amount + locked_amount
+            # Calcular el valor total en USDT (solo activos con saldo)
+            for asset, balance in self._balances_by_asset(account_info).items():
+                total_amount = balance['free'] + balance['locked']
+                
+                if asset == 'USDT':
+                    total_balance += total_amount
+                else:
+                    # Precios de todos los pares en una sola petición, solo si hay algo que convertir
+                    if tickers is None:
+                        try:
+                            tickers = {ticker['symbol']: float(ticker['price']) for ticker in self.client.get_all_tickers()}
+                        except BinanceAPIException as e:
+                            logger.warning("No se pudieron obtener los precios para convertir a USDT: %s", e)
+                            tickers = {}
                     
-                    if asset == 'USDT':
-                        total_balance += total_amount
+                    # Convertir a USDT si es posible
+                    price = tickers.get(f"{asset}USDT")
+                    if price is not None:
+                        total_balance += total_amount * price
                     else:
-                        # Convertir a USDT si es posible
-                        try:
-                            ticker = self.client.get_symbol_ticker(symbol=f"{asset}USDT")
-                            price = float(ticker['price'])
-                            total_balance += total_amount * price
-                        except:
-                            # Si no hay par con USDT, intentar con BTC y luego convertir
-                            try:
-                                ticker_btc = self.client.get_symbol_ticker(symbol=f"{asset}BTC")
-                                price_btc = float(ticker_btc['price'])
-                                ticker_btc_usdt = self.client.get_symbol_ticker(symbol="BTCUSDT")
-                                price_btc_usdt = float(ticker_btc_usdt['price'])
-                                total_balance += total_amount * price_btc * price_btc_usdt
-                            except:
-                                # Si no se puede convertir, ignorar
-                                pass
+                        # Si no hay par con USDT, intentar con BTC y luego convertir
+                        price_btc = tickers.get(f"{asset}BTC")
+                        price_btc_usdt = tickers.get("BTCUSDT")
+                        if price_btc is not None and price_btc_usdt is not None:
+                            total_balance += total_amount * price_btc * price_btc_usdt
+                        # Si no se puede convertir, ignorar
             
             self.initial_daily_balance = total_balance
-            logger.info(f"Balance diario inicial: {self.initial_daily_balance} USDT")
+            logger.info("Balance diario inicial: %s USDT", self.initial_daily_balance)
             return True
         except BinanceAPIException as e:
-            logger.error(f"Error al inicializar balance diario: {e}")
+            logger.error("Error al inicializar balance diario: %s", e)
             return False
     
+    @staticmethod
+    def _balances_by_asset(account_info):
+        """
+        Devuelve {activo: {'free': float, 'locked': float}} con los activos de la cuenta que tienen
+        saldo, para consultar un activo concreto sin recorrer toda la lista de balances
+        """
+        balances = {}
+        for balance in account_info['balances']:
+            free_amount = float(balance['free'])
+            locked_amount = float(balance['locked'])
+            if free_amount > 0 or locked_amount > 0:
+                balances[balance['asset']] = {'free': free_amount, 'locked': locked_amount}
+        return balances
+    
     def _load_trades_history(self):
         """Carga el historial de operaciones desde el archivo"""
         if os.path.exists(self.trades_history_file):
+            trades = []
+            try:
+                line = b''
+                with open(self.trades_history_file, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            trades.append(_load_json(line))
+                        except ValueError:
+                            # Línea incompleta (p. ej. escritura interrumpida): se descarta
+                            logger.warning("Línea no válida en el historial de operaciones: %r", line.strip()[:80])
+                # Cerrar una última línea sin salto para que la siguiente operación empiece en su propia línea
+                if line and not line.endswith(b'\n'):
+                    with open(self.trades_history_file, 'ab') as f:
+                        f.write(b'\n')
+                return trades
+            except Exception as e:
+                logger.error("Error al cargar historial de operaciones: %s", e)
+                return []
+        elif os.path.exists(self.legacy_trades_history_file):
+            # Migrar el historial del formato JSON anterior
             try:
-                with open(self.trades_history_file, 'r') as f:
-                    return json.load(f)
+                with open(self.legacy_trades_history_file, 'rb') as f:
+                    trades = _load_json(f.read())
+                with open(self.trades_history_file, 'wb') as f:
+                    f.writelines(_dump_json_line(trade) for trade in trades)
+                logger.info("Historial de operaciones migrado a %s: %s operaciones", self.trades_history_file, len(trades))
+                return trades
             except Exception as e:
-                logger.error(f"Error al cargar historial de operaciones: {e}")
+                logger.error("Error al cargar historial de operaciones: %s", e)
                 return []
         else:
             return []
     
-    def _save_trades_history(self):
-        """Guarda el historial de operaciones en el archivo"""
+    def _append_trade(self, trade):
+        """Añade una operación al final del archivo de historial"""
         try:
-            with open(self.trades_history_file, 'w') as f:
-                json.dump(self.trades_history, f, indent=2)
+            with open(self.trades_history_file, 'ab') as f:
+                f.write(_dump_json_line(trade))
             return True
         except Exception as e:
-            logger.error(f"Error al guardar historial de operaciones: {e}")
+            logger.error("Error al guardar historial de operaciones: %s", e)
             return False
     
     def add_trade_to_history(self, trade_data):
         """Añade una operación al historial y actualiza el P&L diario"""
-        trade_data['timestamp'] = datetime.now().isoformat()
+        # Instante de la operación en ns desde epoch (int64, sin conversión al calcular métricas);
+        # el timestamp ISO se mantiene para los lectores del historial en formato texto
+        ts_ns = time.time_ns()
+        trade_data['ts_ns'] = ts_ns
+        trade_data['timestamp'] = datetime.fromtimestamp(ts_ns / 1e9).isoformat()
         self.trades_history.append(trade_data)
-        self._save_trades_history()
+        self._append_trade(trade_data)
         
         # Actualizar P&L diario
         if 'pnl' in trade_data:
             self.daily_pnl += trade_data['pnl']
-            logger.info(f"P&L diario actualizado: {self.daily_pnl} USDT")
+            logger.info("P&L diario actualizado: %s USDT", self.daily_pnl)
     
-    def calculate_position_size(self, price):
+    def calculate_position_size(self, price, account_info=None):
         """
         Calcula el tamaño óptimo de posición basado en la volatilidad
-        y el riesgo máximo permitido
+        y el riesgo máximo permitido (account_info: respuesta de get_account
+        ya obtenida; si no se indica, se consulta la cuenta)
         """
         try:
             # Obtener balance disponible
-            account_info = self.client.get_account()
-            usdt_balance = 0.0
-            for balance in account_info['balances']:
-                if balance['asset'] == 'USDT':
-                    usdt_balance = float(balance['free'])
-                    break
+            if account_info is None:
+                account_info = self.client.get_account()
+            usdt_balance = self._balances_by_asset(account_info).get('USDT', {'free': 0.0})['free']
             
             # Reserva mínima
             available_balance = usdt_balance * (1 - self.min_balance_reserve / 100)
             
-            # Calcular volatilidad reciente
-            klines = self.client.get_historical_klines(
-                self.symbol, Client.KLINE_INTERVAL_1HOUR, "1 day ago UTC"
-            )
-            
-            prices = [float(kline[4]) for kline in klines]  # Precio de cierre
-            returns = [prices[i] / prices[i-1] - 1 for i in range(1, len(prices))]
-            volatility = np.std(returns) * 100  # Volatilidad en porcentaje
+            # Calcular volatilidad reciente (velas de 1 hora del último día)
+            volatility = self._get_returns_volatility(*self._position_volatility_window) * 100  # En porcentaje
             
             # Ajustar el tamaño de posición según la volatilidad
             # Mayor volatilidad = menor tamaño de posición
@@ -168,45 +300,171 @@ class RiskManager:
             # Limitar al tamaño de inversión configurado
             position_size = min(max_position_size, self.config.INVESTMENT_AMOUNT)
             
-            logger.info(f"Tamaño de posición calculado: {position_size} USDT (factor volatilidad: {volatility_factor:.2f})")
+            logger.info("Tamaño de posición calculado: %s USDT (factor volatilidad: %.2f)", position_size, volatility_factor)
             return position_size
         except Exception as e:
-            logger.error(f"Error al calcular tamaño de posición: {e}")
+            logger.error("Error al calcular tamaño de posición: %s", e)
             return self.config.INVESTMENT_AMOUNT * 0.5  # Valor conservador por defecto
     
+    def _get_returns_volatility(self, interval, lookback_seconds):
+        """
+        Devuelve la desviación típica de los retornos de cierre de las velas de los últimos
+        lookback_seconds. Las velas se guardan en caché hasta que cierra la vela en curso; al
+        refrescar solo se piden las velas nuevas y la varianza se actualiza de forma incremental.
+        """
+        key = (interval, lookback_seconds)
+        window = self._kline_windows.get(key)
+        now_ms = int(time.time() * 1000)
+        
+        if window is not None and now_ms < window['expires_ms']:
+            return window['stats'].std()
+        
+        if window is None or not window['open_times']:
+            window = {'open_times': deque(), 'closes': deque(), 'stats': _RollingStats(), 'expires_ms': 0}
+            start = now_ms - lookback_seconds * 1000
+        else:
+            # La última vela guardada estaba en curso: se vuelve a pedir para tener su cierre definitivo
+            start = window['open_times'][-1]
+        
+        klines = self.client.get_historical_klines(self.symbol, interval, start)
+        
+        with self._kline_lock:
+            self._merge_klines(window, klines, now_ms - lookback_seconds * 1000)
+            if key == self._pause_volatility_window:
+                self._update_volatility_ewma(window)
+            interval_ms = _INTERVAL_MS[interval]
+            window['expires_ms'] = window['open_times'][-1] + interval_ms if window['open_times'] else now_ms + interval_ms
+            self._kline_windows[key] = window
+            return window['stats'].std()
+    
+    def _merge_klines(self, window, klines, cutoff_ms):
+        """Incorpora velas nuevas a la ventana y descarta las anteriores a cutoff_ms, actualizando la varianza"""
+        open_times = window['open_times']
+        closes = window['closes']
+        stats = window['stats']
+        
+        for kline in klines:
+            open_time = kline[0]
+            close = float(kline[4])  # Precio de cierre
+            if open_times and open_time == open_times[-1]:
+                # Misma vela con un cierre actualizado: sustituir su retorno
+                if len(closes) >= 2:
+                    stats.remove(closes[-1] / closes[-2] - 1)
+                    stats.add(close / closes[-2] - 1)
+                closes[-1] = close
+            elif not open_times or open_time > open_times[-1]:
+                if closes:
+                    stats.add(close / closes[-1] - 1)
+                open_times.append(open_time)
+                closes.append(close)
+        
+        while open_times and open_times[0] < cutoff_ms:
+            if len(closes) >= 2:
+                stats.remove(closes[1] / closes[0] - 1)
+            open_times.popleft()
+            closes.popleft()
+    
+    def _update_volatility_ewma(self, window):
+        """
+        Incorpora a la volatilidad EWMA las velas cerradas de la ventana que aún no se habían
+        procesado (la última vela de la ventana sigue en curso y se ignora). La primera vez se
+        siembra con la media y la varianza de los retornos de las velas cerradas de la ventana.
+        """
+        open_times = window['open_times']
+        closes = window['closes']
+        closed = len(closes) - 1
+        if closed < 2:
+            return
+        
+        if self._ewma_last_open_time is None:
+            returns = np.diff(np.log(np.fromiter(islice(closes, closed), dtype=np.float64, count=closed)))
+            self._ewma_mean = float(returns.mean())
+            self._ewma_var = float(returns.var())
+            self._ewma_last_open_time = open_times[closed - 1]
+            self._ewma_prev_close = closes[closed - 1]
+            return
+        
+        alpha = self._vol_alpha
+        for open_time, close in islice(zip(open_times, closes), closed):
+            if open_time <= self._ewma_last_open_time:
+                continue
+            diff = math.log(close / self._ewma_prev_close) - self._ewma_mean
+            increment = alpha * diff
+            self._ewma_mean += increment
+            self._ewma_var = (1 - alpha) * (self._ewma_var + diff * increment)
+            self._ewma_prev_close = close
+            self._ewma_last_open_time = open_time
+    
+    def start_streams(self):
+        """Inicia los streams WebSocket de velas que mantienen actualizada la volatilidad sin polling REST"""
+        if self._ws_manager:
+            return True
+        try:
+            self._ws_manager = ThreadedWebsocketManager(
+                api_key=self.config.TESTNET_API_KEY,
+                api_secret=self.config.TESTNET_API_SECRET,
+                testnet=True
+            )
+            self._ws_manager.start()
+            for interval in _INTERVAL_MS:
+                self._ws_manager.start_kline_socket(callback=self._handle_kline_event, symbol=self.symbol, interval=interval)
+            logger.info("Streams de velas iniciados para %s", self.symbol)
+            return True
+        except Exception as e:
+            logger.error("Error al iniciar streams de velas, se usará REST: %s", e)
+            self._ws_manager = None
+            return False
+    
+    def stop_streams(self):
+        """Detiene los streams WebSocket de velas"""
+        if self._ws_manager:
+            self._ws_manager.stop()
+            self._ws_manager = None
+            logger.info("Streams de velas detenidos")
+    
+    def _handle_kline_event(self, msg):
+        """
+        Actualiza con cada evento del stream <symbol>@kline_<intervalo> las ventanas de velas de ese
+        intervalo y prolonga su validez hasta el cierre de la vela en curso
+        """
+        if msg.get('e') == 'error':
+            logger.error("Error en el stream de velas: %s", msg)
+            return
+        kline = msg['k']
+        interval_ms = _INTERVAL_MS.get(kline['i'])
+        if interval_ms is None:
+            return
+        
+        with self._kline_lock:
+            for (interval, lookback_seconds), window in self._kline_windows.items():
+                # Solo se actualizan ventanas ya cargadas por REST, para que la serie sea continua
+                if interval != kline['i'] or not window['open_times']:
+                    continue
+                self._merge_klines(window, [[kline['t'], 0, 0, 0, kline['c']]], msg['E'] - lookback_seconds * 1000)
+                if (interval, lookback_seconds) == self._pause_volatility_window:
+                    self._update_volatility_ewma(window)
+                window['expires_ms'] = kline['t'] + interval_ms
+    
     def should_pause_trading(self):
         """
         Determina si el trading debe pausarse basado en condiciones de mercado
         y límites de riesgo
         """
         try:
-            # Verificar pérdida diaria máxima
-            if self.daily_pnl < 0 and abs(self.daily_pnl) > (self.initial_daily_balance * self.max_daily_loss_percent / 100):
-                self.trading_paused = True
-                self.pause_reason = f"Pérdida diaria máxima alcanzada: {abs(self.daily_pnl)} USDT"
-                logger.warning(self.pause_reason)
-                return True
+            # Las comprobaciones se evalúan de la más barata a la más cara y se detienen en la
+            # primera que pide pausar. Las que consultan el mercado (volatilidad y órdenes
+            # abiertas) reutilizan su resultado durante pause_check_ttl segundos.
+            reason = self._check_daily_loss()
+            if not reason:
+                now = time.monotonic()
+                if now >= self._market_checks_expire:
+                    self._market_pause_reason = self._check_volatility() or self._check_open_positions()
+                    self._market_checks_expire = now + self.pause_check_ttl
+                reason = self._market_pause_reason
             
-            # Verificar volatilidad del mercado
-            klines = self.client.get_historical_klines(
-                self.symbol, Client.KLINE_INTERVAL_15MINUTE, "4 hours ago UTC"
-            )
-            
-            prices = [float(kline[4]) for kline in klines]  # Precio de cierre
-            returns = [prices[i] / prices[i-1] - 1 for i in range(1, len(prices))]
-            recent_volatility = np.std(returns) * 100 * 4  # Anualizada
-            
-            if recent_volatility > self.market_volatility_threshold:
-                self.trading_paused = True
-                self.pause_reason = f"Alta volatilidad del mercado: {recent_volatility:.2f}%"
-                logger.warning(self.pause_reason)
-                return True
-            
-            # Verificar número de posiciones abiertas
-            open_orders = self.client.get_open_orders(symbol=self.symbol)
-            if len(open_orders) >= self.max_open_positions:
+            if reason:
                 self.trading_paused = True
-                self.pause_reason = f"Número máximo de posiciones abiertas alcanzado: {len(open_orders)}"
+                self.pause_reason = reason
                 logger.warning(self.pause_reason)
                 return True
             
@@ -215,48 +473,70 @@ class RiskManager:
             self.pause_reason = ""
             return False
         except Exception as e:
-            logger.error(f"Error al evaluar condiciones de pausa: {e}")
+            logger.error("Error al evaluar condiciones de pausa: %s", e)
             return False
     
+    def _check_daily_loss(self):
+        """Verifica la pérdida diaria máxima (sin llamadas a la API)"""
+        if self.daily_pnl < 0 and abs(self.daily_pnl) > (self.initial_daily_balance * self.max_daily_loss_percent / 100):
+            return f"Pérdida diaria máxima alcanzada: {abs(self.daily_pnl)} USDT"
+        return ""
+    
+    def _check_volatility(self):
+        """Verifica la volatilidad del mercado (EWMA de las velas de 15 minutos, en caché)"""
+        # Refrescar la ventana de velas si ha cerrado la vela en curso; esto actualiza la EWMA
+        self._get_returns_volatility(*self._pause_volatility_window)
+        recent_volatility = math.sqrt(self._ewma_var) * 100 * 4  # Anualizada
+        if recent_volatility > self.market_volatility_threshold:
+            return f"Alta volatilidad del mercado: {recent_volatility:.2f}%"
+        return ""
+    
+    def _check_open_positions(self):
+        """Verifica el número de posiciones abiertas (una llamada REST)"""
+        open_orders = self.client.get_open_orders(symbol=self.symbol)
+        if len(open_orders) >= self.max_open_positions:
+            return f"Número máximo de posiciones abiertas alcanzado: {len(open_orders)}"
+        return ""
+    
     def calculate_risk_metrics(self):
         """Calcula métricas de riesgo basadas en el historial de operaciones"""
         try:
             if not self.trades_history:
                 return {}
             
-            # Convertir historial a DataFrame para análisis
-            df = pd.DataFrame(self.trades_history)
+            # Arrays del historial (sin volver a convertir las operaciones ya analizadas)
+            n = self._sync_trade_arrays()
             
-            # Asegurarse de que hay columna de PnL
-            if 'pnl' not in df.columns:
+            # Asegurarse de que alguna operación tiene PnL
+            if not self._history_has_pnl:
                 return {}
             
-            # Convertir timestamp a datetime
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            # Filtrar operaciones de los últimos 7 días: el historial está ordenado por timestamp,
+            # así que basta una búsqueda binaria y un corte
+            week_ago_ns = time.time_ns() - 7 * 86400 * 10 ** 9
+            start = np.searchsorted(self._ts_ns[:n], week_ago_ns, side='right')
             
-            # Filtrar operaciones de los últimos 7 días
-            week_ago = datetime.now() - timedelta(days=7)
-            recent_df = df[df['timestamp'] > week_ago]
-            
-            if len(recent_df) == 0:
+            if start >= n:
                 return {}
             
-            # Calcular métricas
-            win_rate = len(recent_df[recent_df['pnl'] > 0]) / len(recent_df) * 100
-            avg_profit = recent_df[recent_df['pnl'] > 0]['pnl'].mean() if len(recent_df[recent_df['pnl'] > 0]) > 0 else 0
-            avg_loss = recent_df[recent_df['pnl'] < 0]['pnl'].mean() if len(recent_df[recent_df['pnl'] < 0]) > 0 else 0
-            profit_factor = abs(recent_df[recent_df['pnl'] > 0]['pnl'].sum() / recent_df[recent_df['pnl'] < 0]['pnl'].sum()) if recent_df[recent_df['pnl'] < 0]['pnl'].sum() != 0 else float('inf')
-            
-            # Calcular drawdown
-            cumulative = recent_df['pnl'].cumsum()
-            max_dd = 0
-            peak = cumulative.iloc[0]
+            # Calcular métricas sobre el PnL en ticks enteros (int64), con una sola máscara para
+            # ganancias y otra para pérdidas; las operaciones sin PnL cuentan como 0 ticks
+            # (cada suma se calcula una sola vez y de ella se derivan medias y profit factor)
+            pnl_ticks = self._pnl_ticks[start:n]
+            profits = pnl_ticks[pnl_ticks > 0]
+            losses = pnl_ticks[pnl_ticks < 0]
+            gross_profit = int(profits.sum())
+            gross_loss = int(losses.sum())
+            win_rate = profits.size / pnl_ticks.size * 100
+            avg_profit = gross_profit / profits.size / _PNL_TICKS_PER_USDT if profits.size > 0 else 0
+            avg_loss = gross_loss / losses.size / _PNL_TICKS_PER_USDT if losses.size > 0 else 0
+            profit_factor = abs(gross_profit / gross_loss) if gross_loss != 0 else float('inf')
             
-            for value in cumulative:
-                if value > peak:
-                    peak = value
-                dd = (peak - value) / peak * 100 if peak > 0 else 0
-                max_dd = max(max_dd, dd)
+            # Calcular drawdown respecto al pico acumulado (solo cuando el pico es positivo)
+            cumulative = np.cumsum(pnl_ticks)
+            peaks = np.maximum.accumulate(cumulative)
+            drawdowns = np.divide(peaks - cumulative, peaks, out=np.zeros(cumulative.size), where=peaks > 0) * 100
+            max_dd = drawdowns.max()
             
             # Guardar métricas
             self.risk_metrics = {
@@ -265,25 +545,122 @@ class RiskManager:
                 'avg_loss': avg_loss,
                 'profit_factor': profit_factor,
                 'max_drawdown': max_dd,
-                'sharpe_ratio': self._calculate_sharpe_ratio(recent_df['pnl']),
-                'total_trades': len(recent_df),
-                'profitable_trades': len(recent_df[recent_df['pnl'] > 0]),
-                'losing_trades': len(recent_df[recent_df['pnl'] < 0])
+                'sharpe_ratio': self._calculate_sharpe_ratio(
+                    pnl_ticks[self._has_pnl[start:n]] / _PNL_TICKS_PER_USDT),
+                'total_trades': pnl_ticks.size,
+                'profitable_trades': profits.size,
+                'losing_trades': losses.size
             }
             
-            logger.info(f"Métricas de riesgo calculadas: {self.risk_metrics}")
+            logger.info("Métricas de riesgo calculadas: %s", self.risk_metrics)
             return self.risk_metrics
         except Exception as e:
-            logger.error(f"Error al calcular métricas de riesgo: {e}")
+            logger.error("Error al calcular métricas de riesgo: %s", e)
             return {}
     
+    def calculate_rolling_risk_metrics(self, window=100):
+        """
+        Calcula win rate, profit factor y drawdown máximo para cada ventana de `window` operaciones
+        consecutivas del historial completo, en una sola pasada vectorizada. Permite evaluar las
+        reglas de adjust_parameters_based_on_performance sobre todo el historial sin reejecutar el
+        sistema. Devuelve un diccionario de arrays (uno por métrica, una fila por ventana, con el
+        instante UTC de la última operación de cada ventana) o {} si no hay suficientes operaciones.
+        """
+        n = self._sync_trade_arrays()
+        if window < 1 or n < window or not self._history_has_pnl:
+            return {}
+        
+        windows = sliding_window_view(self._pnl_ticks[:n], window)
+        gross_profit = np.where(windows > 0, windows, 0).sum(axis=1)
+        gross_loss = np.where(windows < 0, windows, 0).sum(axis=1)
+        profit_factor = np.full(gross_profit.size, float('inf'))
+        np.divide(gross_profit, -gross_loss, out=profit_factor, where=gross_loss != 0)
+        
+        # Drawdown de cada ventana respecto a su propio pico acumulado (como en calculate_risk_metrics)
+        cumulative = np.cumsum(windows, axis=1)
+        peaks = np.maximum.accumulate(cumulative, axis=1)
+        drawdowns = np.divide(peaks - cumulative, peaks, out=np.zeros(cumulative.shape), where=peaks > 0) * 100
+        
+        return {
+            'end_timestamp': self._ts_ns[window - 1:n].astype('datetime64[ns]'),
+            'win_rate': np.count_nonzero(windows > 0, axis=1) / window * 100,
+            'profit_factor': profit_factor,
+            'max_drawdown': drawdowns.max(axis=1)
+        }
+    
+    def _sync_trade_arrays(self):
+        """
+        Añade a los arrays del historial (_ts_ns, _pnl_ticks, _has_pnl) las operaciones incorporadas
+        desde la última llamada y devuelve el número de filas válidas. Las operaciones sin timestamp
+        válido no se incluyen; sin PnL cuentan como 0 ticks.
+        """
+        new_trades = self.trades_history[self._trades_synced:]
+        n = self._n_trades
+        if not new_trades:
+            return n
+        
+        needed = n + len(new_trades)
+        if needed > self._ts_ns.size:
+            capacity = max(needed, 2 * self._ts_ns.size)
+            self._ts_ns = self._grow_array(self._ts_ns, n, capacity)
+            self._pnl_ticks = self._grow_array(self._pnl_ticks, n, capacity)
+            self._has_pnl = self._grow_array(self._has_pnl, n, capacity)
+        
+        in_order = True
+        for trade in new_trades:
+            pnl = trade.get('pnl')
+            has_pnl = pnl is not None and pnl == pnl  # None y NaN cuentan como sin PnL
+            self._history_has_pnl = self._history_has_pnl or has_pnl
+            ts = self._trade_ts_ns(trade)
+            if ts is None:
+                continue
+            
+            # Las operaciones se añaden en orden cronológico; solo se reordena si no es así
+            if n and ts < self._ts_ns[n - 1]:
+                in_order = False
+            self._ts_ns[n] = ts
+            self._pnl_ticks[n] = round(pnl * _PNL_TICKS_PER_USDT) if has_pnl else 0
+            self._has_pnl[n] = has_pnl
+            n += 1
+        
+        if not in_order:
+            order = np.argsort(self._ts_ns[:n], kind='stable')
+            self._ts_ns[:n] = self._ts_ns[:n][order]
+            self._pnl_ticks[:n] = self._pnl_ticks[:n][order]
+            self._has_pnl[:n] = self._has_pnl[:n][order]
+        
+        self._n_trades = n
+        self._trades_synced = len(self.trades_history)
+        return n
+    
+    @staticmethod
+    def _trade_ts_ns(trade):
+        """
+        Instante de una operación en ns desde epoch: ts_ns si existe; si no (historial anterior),
+        se convierte el timestamp ISO (hora local si no indica zona). None si no es válido.
+        """
+        ts_ns = trade.get('ts_ns')
+        if ts_ns is not None:
+            return ts_ns
+        try:
+            return round(datetime.fromisoformat(trade['timestamp']).timestamp() * 1e6) * 1000
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _grow_array(arr, n, capacity):
+        """Copia las n primeras filas de arr en un array nuevo de la capacidad indicada"""
+        grown = np.empty(capacity, dtype=arr.dtype)
+        grown[:n] = arr[:n]
+        return grown
+    
     def _calculate_sharpe_ratio(self, returns, risk_free_rate=0.02/365):
         """Calcula el ratio de Sharpe para una serie de retornos"""
         if len(returns) < 2:
             return 0
         
-        mean_return = returns.mean()
-        std_return = returns.std()
+        mean_return = np.mean(returns)
+        std_return = np.std(returns, ddof=1)
         
         if std_return == 0:
             return 0
@@ -309,29 +686,29 @@ class RiskManager:
                 # Buen rendimiento, podemos ser un poco más agresivos
                 new_investment = min(self.config.INVESTMENT_AMOUNT * 1.1, 
                                     self.config.INVESTMENT_AMOUNT * 2)  # Máximo doble del original
-                logger.info(f"Aumentando tamaño de inversión a {new_investment} USDT debido al buen rendimiento")
+                logger.info("Aumentando tamaño de inversión a %s USDT debido al buen rendimiento", new_investment)
                 self.config.INVESTMENT_AMOUNT = new_investment
             elif win_rate < 40 or profit_factor < 1 or max_drawdown > 20:
                 # Mal rendimiento, reducir exposición
                 new_investment = max(self.config.INVESTMENT_AMOUNT * 0.8, 
                                     self.config.INVESTMENT_AMOUNT * 0.5)  # Mínimo mitad del original
-                logger.info(f"Reduciendo tamaño de inversión a {new_investment} USDT debido al rendimiento subóptimo")
+                logger.info("Reduciendo tamaño de inversión a %s USDT debido al rendimiento subóptimo", new_investment)
                 self.config.INVESTMENT_AMOUNT = new_investment
             
             # Ajustar take profit y stop loss
             if win_rate < 45 and self.config.TAKE_PROFIT_PERCENT > 0.7:
                 # Si ganamos poco, reducir objetivo de beneficio para cerrar trades más rápido
                 self.config.TAKE_PROFIT_PERCENT *= 0.9
-                logger.info(f"Reduciendo take profit a {self.config.TAKE_PROFIT_PERCENT:.2f}%")
+                logger.info("Reduciendo take profit a %.2f%%", self.config.TAKE_PROFIT_PERCENT)
             
             if max_drawdown > 15 and self.config.STOP_LOSS_PERCENT < 0.7:
                 # Si el drawdown es alto, ajustar stop loss para salir antes
                 self.config.STOP_LOSS_PERCENT *= 0.9
-                logger.info(f"Ajustando stop loss a {self.config.STOP_LOSS_PERCENT:.2f}%")
+                logger.info("Ajustando stop loss a %.2f%%", self.config.STOP_LOSS_PERCENT)
             
             return True
         except Exception as e:
-            logger.error(f"Error al ajustar parámetros: {e}")
+            logger.error("Error al ajustar parámetros: %s", e)
             return False
     
     def get_status_report(self):
@@ -355,10 +732,10 @@ class RiskManager:
         
         return status
     
-    def reset_daily_metrics(self):
+    def reset_daily_metrics(self, account_info=None):
         """Reinicia las métricas diarias (debe llamarse al inicio de cada día)"""
         self.daily_pnl = 0.0
-        self._initialize_daily_balance()
+        self._initialize_daily_balance(account_info)
         self.trading_paused = False
         self.pause_reason = ""
         logger.info("Métricas diarias reiniciadas")
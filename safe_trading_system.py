@@ -5,7 +5,6 @@ Integración del bot de trading con el gestor de riesgos
 
 import time
 import logging
-from datetime import datetime
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 import config
@@ -41,11 +40,17 @@ class SafeTradingSystem:
         # Inicializar componentes
         self.bot = GridTradingBot()
         self.risk_manager = RiskManager(self.client, config)
+        # Activo base del par (p. ej. BTC en BTCUSDT), calculado una sola vez
+        self._base_asset = self.bot.symbol.replace("USDT", "")
         
         # Estado del sistema
         self.is_running = False
-        self.last_parameter_adjustment = datetime.now()
-        self.last_status_report = datetime.now()
+        # Última respuesta de get_account, reutilizable por el bot y el gestor de riesgos en la misma iteración
+        self._account_info = None
+        self._account_info_time = 0.0
+        # Próximos ajuste de parámetros e informe de estado (reloj monotónico, inmune a cambios de hora)
+        self._next_adjust_ts = time.monotonic() + 24 * 3600
+        self._next_report_ts = time.monotonic() + 6 * 3600
         
         logger.info("Sistema de trading seguro inicializado")
     
@@ -57,10 +62,14 @@ class SafeTradingSystem:
         try:
             # Verificar conexión
             server_time = self.client.get_server_time()
-            logger.info(f"Conectado a Binance. Tiempo del servidor: {server_time}")
+            logger.info("Conectado a Binance. Tiempo del servidor: %s", server_time)
             
-            # Configuración inicial
-            if not self.bot.calculate_grid_prices():
+            # Recibir precio, balances y velas por WebSocket en lugar de consultarlos por REST
+            self.bot.start_streams()
+            self.risk_manager.start_streams()
+            
+            # Configuración inicial (se reutiliza la cuadrícula persistida si sigue vigente)
+            if not self.bot.grid_prices and not self.bot.calculate_grid_prices():
                 logger.error("No se pudo calcular la cuadrícula inicial. Abortando.")
                 return
             
@@ -68,7 +77,7 @@ class SafeTradingSystem:
             while self.is_running:
                 # Verificar si el trading debe pausarse por razones de riesgo
                 if self.risk_manager.should_pause_trading():
-                    logger.warning(f"Trading pausado: {self.risk_manager.pause_reason}")
+                    logger.warning("Trading pausado: %s", self.risk_manager.pause_reason)
                     time.sleep(config.CHECK_INTERVAL)
                     continue
                 
@@ -83,50 +92,64 @@ class SafeTradingSystem:
                 
                 # Verificar si se ha alcanzado el límite diario de operaciones
                 if self.bot.daily_trades_count >= self.bot.max_trades_per_day:
-                    logger.info(f"Límite diario de operaciones alcanzado ({self.bot.max_trades_per_day}). Esperando al siguiente día.")
+                    logger.info("Límite diario de operaciones alcanzado (%s). Esperando al siguiente día.", self.bot.max_trades_per_day)
                     self.bot.reset_daily_counter()
                 
                 # Ajustar parámetros basados en rendimiento (cada 24 horas)
-                hours_since_adjustment = (datetime.now() - self.last_parameter_adjustment).total_seconds() / 3600
-                if hours_since_adjustment >= 24:
+                if time.monotonic() >= self._next_adjust_ts:
                     logger.info("Ajustando parámetros basados en rendimiento...")
                     self.risk_manager.adjust_parameters_based_on_performance()
-                    self.last_parameter_adjustment = datetime.now()
+                    self._next_adjust_ts = time.monotonic() + 24 * 3600
                 
                 # Generar informe de estado (cada 6 horas)
-                hours_since_report = (datetime.now() - self.last_status_report).total_seconds() / 3600
-                if hours_since_report >= 6:
+                if time.monotonic() >= self._next_report_ts:
                     status_report = self.risk_manager.get_status_report()
-                    logger.info(f"Informe de estado: {status_report}")
-                    self.last_status_report = datetime.now()
+                    logger.info("Informe de estado: %s", status_report)
+                    self._next_report_ts = time.monotonic() + 6 * 3600
                 
                 # Mostrar estado actual
                 current_price = self.bot.get_current_price()
-                usdt_balance = self.bot.get_account_balance("USDT")
-                btc_balance = self.bot.get_account_balance(self.bot.symbol.replace("USDT", ""))
+                # Si el bot no recibe los balances por WebSocket, una sola consulta de cuenta sirve para ambos
+                account_info = None if self.bot.balances_streaming else self._account_snapshot()
+                usdt_balance = self.bot.get_account_balance("USDT", account_info)
+                btc_balance = self.bot.get_account_balance(self._base_asset, account_info)
                 
-                logger.info(f"Precio actual: {current_price} USDT")
-                logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.bot.symbol.replace('USDT', '')}: {btc_balance}")
-                logger.info(f"Operaciones hoy: {self.bot.daily_trades_count}/{self.bot.max_trades_per_day}")
-                logger.info(f"P&L diario: {self.risk_manager.daily_pnl} USDT")
+                logger.info("Precio actual: %s USDT", current_price)
+                logger.info("Balance USDT: %s", usdt_balance)
+                logger.info("Balance %s: %s", self._base_asset, btc_balance)
+                logger.info("Operaciones hoy: %s/%s", self.bot.daily_trades_count, self.bot.max_trades_per_day)
+                logger.info("P&L diario: %s USDT", self.risk_manager.daily_pnl)
                 
-                # Esperar antes de la siguiente iteración
-                logger.info(f"Esperando {config.CHECK_INTERVAL} segundos...")
-                time.sleep(config.CHECK_INTERVAL)
+                # Esperar a un evento de orden o, como máximo, CHECK_INTERVAL para las comprobaciones periódicas
+                logger.info("Esperando eventos de órdenes (máximo %s segundos)...", config.CHECK_INTERVAL)
+                self.bot.wait_for_order_events(config.CHECK_INTERVAL)
                 
         except KeyboardInterrupt:
             logger.info("Sistema detenido manualmente.")
             self.stop()
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             self.stop()
     
+    def _account_snapshot(self, max_age=1.0):
+        """Devuelve la información de la cuenta, reutilizando la última consulta si tiene menos de max_age segundos"""
+        now = time.monotonic()
+        if self._account_info is None or now - self._account_info_time > max_age:
+            try:
+                self._account_info = self.client.get_account()
+                self._account_info_time = now
+            except BinanceAPIException as e:
+                logger.error("Error al obtener información de la cuenta: %s", e)
+                return None
+        return self._account_info
+    
     def stop(self):
         """Detiene el sistema de trading seguro"""
         logger.info("Deteniendo sistema de trading seguro...")
         self.is_running = False
         self.bot.cancel_all_orders()
+        self.bot.stop_streams()
+        self.risk_manager.stop_streams()
         logger.info("Sistema detenido.")
 
 if __name__ == "__main__":
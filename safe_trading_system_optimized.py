@@ -5,9 +5,13 @@ Sistema de Trading Seguro Optimizado
 
 import time
 import logging
-from datetime import datetime
+import threading
+from collections import deque
+from itertools import chain
+import numpy as np
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
+from requests.adapters import HTTPAdapter
 import config
 from grid_trading_bot_optimized import GridTradingBotOptimized
 from risk_manager import RiskManager
@@ -23,71 +27,110 @@ logging.basicConfig(
 )
 logger = logging.getLogger("trading_system_optimized")
 
+# Duración de una vela de 4 horas (ms)
+_INTERVAL_4H_MS = 4 * 60 * 60 * 1000
+
+# Condición del mercado indexada por el signo de la tendencia + 1
+_MARKET_CONDITIONS = ("bearish", "neutral", "bullish")
+
 class SafeTradingSystemOptimized:
     """
     Sistema de trading seguro optimizado que integra el bot de trading con el gestor de riesgos
     para garantizar operaciones con bajo riesgo y crecimiento diario.
     """
     
-    def __init__(self):
-        """Inicializa el sistema de trading seguro optimizado"""
+    def __init__(self, client=None):
+        """
+        Inicializa el sistema de trading seguro optimizado
+        
+        Args:
+            client: Cliente de Binance a reutilizar (p. ej. el del probador), para compartir su sesión
+                HTTP y sus conexiones keep-alive. Si no se indica se crea uno nuevo.
+        """
         # Inicializar cliente de Binance
-        self.client = Client(
+        self.client = client or Client(
             api_key=config.TESTNET_API_KEY,
             api_secret=config.TESTNET_API_SECRET,
             testnet=True
         )
+        # Pool de conexiones keep-alive de la sesión, compartido por el sistema, el gestor de riesgos
+        # y quien haya proporcionado el cliente
+        self.client.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
         
         # Inicializar componentes
         self.bot = GridTradingBotOptimized()
         self.risk_manager = RiskManager(self.client, config)
+        # Activo base del par (p. ej. BTC en BTCUSDT), calculado una sola vez
+        self._base_asset = self.bot.symbol.replace("USDT", "")
         
         # Estado del sistema
         self.is_running = False
-        self.last_parameter_adjustment = datetime.now()
-        self.last_status_report = datetime.now()
+        # Última respuesta de get_account, reutilizable por el bot y el gestor de riesgos en la misma iteración
+        self._account_info = None
+        self._account_info_time = 0.0
+        # Valores consultados una sola vez por iteración del bucle principal (se vacía al empezar cada una)
+        self._iter_cache = {}
+        # Próximos ajuste de parámetros e informe de estado (reloj monotónico, inmune a cambios de hora)
+        self._next_adjust_ts = time.monotonic() + 12 * 3600
+        self._next_report_ts = time.monotonic() + 4 * 3600
         self.market_condition = "neutral"  # neutral, bullish, bearish
+        # Hilo que reevalúa la condición del mercado sin bloquear el bucle principal, que solo lee
+        # self.market_condition (una asignación de atributo es atómica)
+        self._market_thread = None
+        # Se activa al detener el sistema e interrumpe de inmediato las esperas del bucle y del hilo de mercado
+        self._stop_event = threading.Event()
+        # Cierres de las velas de 4h ya cerradas usados por analyze_market_condition
+        self._closes_4h = deque(maxlen=11)
+        self._last_4h_close = None
+        self._closes_4h_expires_ms = 0
         
         logger.info("Sistema de trading seguro optimizado inicializado")
     
     def analyze_market_condition(self):
         """Analiza la condición actual del mercado para ajustar la estrategia"""
         try:
-            # Obtener datos históricos
-            klines = self.client.get_historical_klines(
-                self.bot.symbol, Client.KLINE_INTERVAL_4HOUR, "3 days ago UTC"
-            )
+            # Cierres de las 11 últimas velas de 4h cerradas: solo se vuelven a pedir cuando cierra la vela en curso
+            if time.time() * 1000 >= self._closes_4h_expires_ms:
+                klines = self.client.get_klines(symbol=self.bot.symbol, interval=Client.KLINE_INTERVAL_4HOUR, limit=12)
+                if len(klines) < 12:  # Necesitamos al menos 12 períodos de 4 horas
+                    return "neutral"
+                self._closes_4h.extend(float(kline[4]) for kline in klines[:-1])
+                self._last_4h_close = float(klines[-1][4])
+                self._closes_4h_expires_ms = klines[-1][0] + _INTERVAL_4H_MS
             
-            if len(klines) < 12:  # Necesitamos al menos 12 períodos de 4 horas
-                return "neutral"
+            # El cierre de la vela en curso es el precio actual (del stream del bot si está disponible)
+            current_price = self.bot.get_current_price() or self._last_4h_close
             
-            # Calcular medias móviles
-            prices = [float(kline[4]) for kline in klines]  # Precio de cierre
-            ma_short = sum(prices[-6:]) / 6  # Media móvil de 24 horas (6 períodos de 4h)
-            ma_long = sum(prices[-12:]) / 12  # Media móvil de 48 horas (12 períodos de 4h)
+            # Calcular medias móviles sobre un array de precios de cierre (las 12 últimas velas)
+            closes = np.fromiter(chain(self._closes_4h, (current_price,)), dtype=np.float64, count=12)
+            ma_short = closes[-6:].mean()  # Media móvil de 24 horas (6 períodos de 4h)
+            ma_long = closes.mean()  # Media móvil de 48 horas (12 períodos de 4h)
             
-            # Calcular tendencia
-            if ma_short > ma_long * 1.005:  # 0.5% por encima
-                new_condition = "bullish"
-            elif ma_short < ma_long * 0.995:  # 0.5% por debajo
-                new_condition = "bearish"
-            else:
-                new_condition = "neutral"
+            # Calcular tendencia: signo de la diferencia entre medias con una banda muerta del 0.5%
+            # (-1 bajista, 0 neutral, 1 alcista), sin divisiones ni ramas
+            diff = ma_short - ma_long
+            threshold = 0.005 * ma_long
+            sign = int(diff > threshold) - int(diff < -threshold)
+            new_condition = _MARKET_CONDITIONS[sign + 1]
             
             # Registrar cambio de condición
             if new_condition != self.market_condition:
-                logger.info(f"Condición del mercado cambiada: {self.market_condition} -> {new_condition}")
+                logger.info("Condición del mercado cambiada: %s -> %s", self.market_condition, new_condition)
                 self.market_condition = new_condition
             
             return self.market_condition
             
         except Exception as e:
-            logger.error(f"Error al analizar condición del mercado: {e}")
+            logger.error("Error al analizar condición del mercado: %s", e)
             return "neutral"
     
-    def adjust_strategy_for_market_condition(self):
-        """Ajusta la estrategia según la condición del mercado"""
-        condition = self.analyze_market_condition()
+    def adjust_strategy_for_market_condition(self, condition=None):
+        """
+        Ajusta la estrategia según la condición del mercado indicada o, si no se indica,
+        la última calculada (el hilo de mercado la mantiene actualizada)
+        """
+        if condition is None:
+            condition = self.market_condition
         
         if condition == "bullish":
             # En mercado alcista, aumentar take profit y reducir stop loss
@@ -95,11 +138,10 @@ class SafeTradingSystemOptimized:
             self.bot.take_profit_percent = config.TAKE_PROFIT_PERCENT * 1.2
             self.bot.stop_loss_percent = config.STOP_LOSS_PERCENT * 0.8
             # Ajustar distribución de la cuadrícula para favorecer niveles superiores
+            # (calculate_grid_prices obtiene el precio actual por sí mismo)
             if self.bot.grid_prices:
-                current_price = self.bot.get_current_price()
-                if current_price:
-                    # Recalcular cuadrícula con sesgo alcista
-                    self.bot.calculate_grid_prices()
+                # Recalcular cuadrícula con sesgo alcista
+                self.bot.calculate_grid_prices()
         
         elif condition == "bearish":
             # En mercado bajista, reducir take profit y aumentar stop loss
@@ -107,11 +149,10 @@ class SafeTradingSystemOptimized:
             self.bot.take_profit_percent = config.TAKE_PROFIT_PERCENT * 0.8
             self.bot.stop_loss_percent = config.STOP_LOSS_PERCENT * 1.2
             # Ajustar distribución de la cuadrícula para favorecer niveles inferiores
+            # (calculate_grid_prices obtiene el precio actual por sí mismo)
             if self.bot.grid_prices:
-                current_price = self.bot.get_current_price()
-                if current_price:
-                    # Recalcular cuadrícula con sesgo bajista
-                    self.bot.calculate_grid_prices()
+                # Recalcular cuadrícula con sesgo bajista
+                self.bot.calculate_grid_prices()
         
         else:  # neutral
             # En mercado neutral, usar valores predeterminados
@@ -123,11 +164,16 @@ class SafeTradingSystemOptimized:
         """Inicia el sistema de trading seguro optimizado"""
         logger.info("Iniciando sistema de trading seguro optimizado...")
         self.is_running = True
+        self._stop_event.clear()
         
         try:
             # Verificar conexión
             server_time = self.client.get_server_time()
-            logger.info(f"Conectado a Binance. Tiempo del servidor: {server_time}")
+            logger.info("Conectado a Binance. Tiempo del servidor: %s", server_time)
+            
+            # Precio, balances y ejecuciones por WebSocket en lugar de polling REST
+            self.bot.start_streams()
+            self.risk_manager.start_streams()
             
             # Configuración inicial
             if not self.bot.calculate_grid_prices():
@@ -135,15 +181,21 @@ class SafeTradingSystemOptimized:
                 return
             
             # Analizar condición inicial del mercado
-            self.analyze_market_condition()
-            self.adjust_strategy_for_market_condition()
+            self.adjust_strategy_for_market_condition(self.analyze_market_condition())
+            
+            # A partir de aquí la condición del mercado se actualiza en segundo plano
+            self._market_thread = threading.Thread(target=self._market_condition_worker, name="market-condition", daemon=True)
+            self._market_thread.start()
             
             # Bucle principal
             while self.is_running:
+                iteration_start = time.monotonic()
+                self._iter_cache.clear()
+                
                 # Verificar si el trading debe pausarse por razones de riesgo
                 if self.risk_manager.should_pause_trading():
-                    logger.warning(f"Trading pausado: {self.risk_manager.pause_reason}")
-                    time.sleep(config.CHECK_INTERVAL)
+                    logger.warning("Trading pausado: %s", self.risk_manager.pause_reason)
+                    self._stop_event.wait(config.CHECK_INTERVAL)
                     continue
                 
                 # Verificar si es necesario actualizar la cuadrícula
@@ -157,52 +209,87 @@ class SafeTradingSystemOptimized:
                 
                 # Verificar si se ha alcanzado el límite diario de operaciones
                 if self.bot.daily_trades_count >= self.bot.max_trades_per_day:
-                    logger.info(f"Límite diario de operaciones alcanzado ({self.bot.max_trades_per_day}). Esperando al siguiente día.")
+                    logger.info("Límite diario de operaciones alcanzado (%s). Esperando al siguiente día.", self.bot.max_trades_per_day)
                     self.bot.reset_daily_counter()
                 
                 # Ajustar parámetros basados en rendimiento (cada 12 horas)
-                hours_since_adjustment = (datetime.now() - self.last_parameter_adjustment).total_seconds() / 3600
-                if hours_since_adjustment >= 12:
+                if time.monotonic() >= self._next_adjust_ts:
                     logger.info("Ajustando parámetros basados en rendimiento...")
                     self.risk_manager.adjust_parameters_based_on_performance()
-                    self.adjust_strategy_for_market_condition()  # También ajustar según condición del mercado
-                    self.last_parameter_adjustment = datetime.now()
+                    self.adjust_strategy_for_market_condition(self.market_condition)  # También ajustar según condición del mercado
+                    self._next_adjust_ts = time.monotonic() + 12 * 3600
                 
                 # Generar informe de estado (cada 4 horas)
-                hours_since_report = (datetime.now() - self.last_status_report).total_seconds() / 3600
-                if hours_since_report >= 4:
+                if time.monotonic() >= self._next_report_ts:
                     status_report = self.risk_manager.get_status_report()
-                    logger.info(f"Informe de estado: {status_report}")
-                    logger.info(f"Condición del mercado: {self.market_condition}")
-                    self.last_status_report = datetime.now()
+                    logger.info("Informe de estado: %s", status_report)
+                    logger.info("Condición del mercado: %s", self.market_condition)
+                    self._next_report_ts = time.monotonic() + 4 * 3600
                 
                 # Mostrar estado actual
-                current_price = self.bot.get_current_price()
-                usdt_balance = self.bot.get_account_balance("USDT")
-                btc_balance = self.bot.get_account_balance(self.bot.symbol.replace("USDT", ""))
-                
-                logger.info(f"Precio actual: {current_price} USDT")
-                logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.bot.symbol.replace('USDT', '')}: {btc_balance}")
-                logger.info(f"Operaciones hoy: {self.bot.daily_trades_count}/{self.bot.max_trades_per_day}")
-                logger.info(f"P&L diario: {self.risk_manager.daily_pnl} USDT")
+                current_price = self._current_price()
+                # Si el bot no recibe los balances por WebSocket, una sola consulta de cuenta sirve para ambos
+                account_info = None if self.bot.balances_streaming else self._account_snapshot()
+                usdt_balance = self.bot.get_account_balance("USDT", account_info)
+                btc_balance = self.bot.get_account_balance(self._base_asset, account_info)
                 
                 # Esperar antes de la siguiente iteración
-                logger.info(f"Esperando {config.CHECK_INTERVAL} segundos...")
-                time.sleep(config.CHECK_INTERVAL)
+                # Esperar a un evento (ejecución o movimiento de precio) o, como máximo, hasta completar
+                # CHECK_INTERVAL desde el inicio de la iteración (sin acumular deriva)
+                timeout = max(0.0, config.CHECK_INTERVAL - (time.monotonic() - iteration_start))
+                
+                # Estado de la iteración en un único registro
+                logger.info(
+                    "Precio actual: %s USDT\n"
+                    "Balance USDT: %s\n"
+                    "Balance %s: %s\n"
+                    "Operaciones hoy: %s/%s\n"
+                    "P&L diario: %s USDT\n"
+                    "Esperando eventos (máximo %.0f segundos)...",
+                    current_price, usdt_balance, self._base_asset, btc_balance,
+                    self.bot.daily_trades_count, self.bot.max_trades_per_day, self.risk_manager.daily_pnl, timeout
+                )
+                self.bot.wait_for_events(timeout)
                 
         except KeyboardInterrupt:
             logger.info("Sistema detenido manualmente.")
             self.stop()
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             self.stop()
     
+    def _market_condition_worker(self):
+        """Reevalúa la condición del mercado cada MARKET_CONDITION_INTERVAL segundos hasta que se detiene el sistema"""
+        while not self._stop_event.wait(config.MARKET_CONDITION_INTERVAL):
+            self.analyze_market_condition()
+    
+    def _current_price(self):
+        """Precio actual del par, consultado como máximo una vez por iteración del bucle principal"""
+        if 'price' not in self._iter_cache:
+            self._iter_cache['price'] = self.bot.get_current_price()
+        return self._iter_cache['price']
+    
+    def _account_snapshot(self, max_age=1.0):
+        """Devuelve la información de la cuenta, reutilizando la última consulta si tiene menos de max_age segundos"""
+        now = time.monotonic()
+        if self._account_info is None or now - self._account_info_time > max_age:
+            try:
+                self._account_info = self.client.get_account()
+                self._account_info_time = now
+            except BinanceAPIException as e:
+                logger.error("Error al obtener información de la cuenta: %s", e)
+                return None
+        return self._account_info
+    
     def stop(self):
         """Detiene el sistema de trading seguro optimizado"""
         logger.info("Deteniendo sistema de trading seguro optimizado...")
         self.is_running = False
+        self._stop_event.set()
+        self.bot.wake()
         self.bot.cancel_all_orders()
+        self.bot.stop_streams()
+        self.risk_manager.stop_streams()
         logger.info("Sistema detenido.")
 
 if __name__ == "__main__":
@@ -7,6 +7,9 @@ import logging
 import time
 import sys
 import os
+import re
+import mmap
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
@@ -24,6 +27,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger("test_script_optimized")
 
+# Líneas del log de las que se extraen métricas: operaciones del día, posiciones cerradas con PnL
+# y niveles de la cuadrícula (cada alternativa se limita a una línea)
+_LOG_METRICS_PATTERN = re.compile(
+    r"Operaciones hoy:[ \t]*(\d+)"
+    r"|Posición cerrada:[^\n]*pnl': "
+    r"|Cuadrícula[^\n]*?con[ \t]*(\d+)[ \t]*niveles".encode('utf-8')
+)
+
 class OptimizedTradingSystemTester:
     """
     Clase para probar el sistema de trading seguro optimizado en un entorno controlado
@@ -55,11 +66,11 @@ class OptimizedTradingSystemTester:
             # Verificar balances
             balances = {}
             for balance in account_info['balances']:
-                if float(balance['free']) > 0 or float(balance['locked']) > 0:
-                    balances[balance['asset']] = {
-                        'free': float(balance['free']),
-                        'locked': float(balance['locked'])
-                    }
+                # Cada cantidad se convierte a float una sola vez
+                free = float(balance['free'])
+                locked = float(balance['locked'])
+                if free > 0 or locked > 0:
+                    balances[balance['asset']] = {'free': free, 'locked': locked}
             
             # Verificar que hay USDT suficiente para las pruebas
             if 'USDT' not in balances or balances['USDT']['free'] < 100:
@@ -79,49 +90,53 @@ class OptimizedTradingSystemTester:
             return False
         
         try:
-            # Crear y configurar el sistema
-            self.system = SafeTradingSystemOptimized()
+            # Crear y configurar el sistema (comparte el cliente y su sesión HTTP con el probador)
+            self.system = SafeTradingSystemOptimized(client=self.client)
             
             # Modificar parámetros para pruebas
             # Reducir intervalos para acelerar las pruebas
             config.CHECK_INTERVAL = 30  # 30 segundos entre iteraciones
             
-            # Iniciar el sistema en un hilo separado
-            import threading
-            system_thread = threading.Thread(target=self.system.start)
-            system_thread.daemon = True
-            system_thread.start()
+            # Iniciar el sistema en un ejecutor de un solo hilo: el future permite esperar a que termine
+            # (o detectar que ha terminado antes de tiempo) sin sondear el hilo
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trading-system")
+            system_future = executor.submit(self.system.start)
             
             logger.info("Sistema de trading optimizado iniciado en modo de prueba")
             
             # Monitorear el sistema durante la duración de la prueba
             start_time = datetime.now()
             end_time = start_time + timedelta(seconds=self.test_duration)
+            base_asset = self.system.bot.symbol.replace("USDT", "")
             
             while datetime.now() < end_time:
                 # Verificar estado del sistema
-                if not system_thread.is_alive():
-                    logger.error("El hilo del sistema de trading se ha detenido inesperadamente")
+                if system_future.done():
+                    # start() captura sus propias excepciones: el motivo queda en trading_system_optimized.log
+                    logger.error("El hilo del sistema de trading se ha detenido inesperadamente (ver trading_system_optimized.log)")
                     return False
                 
                 # Registrar estado actual
                 current_price = self.system.bot.get_current_price()
                 usdt_balance = self.system.bot.get_account_balance("USDT")
-                btc_balance = self.system.bot.get_account_balance(self.system.bot.symbol.replace("USDT", ""))
+                btc_balance = self.system.bot.get_account_balance(base_asset)
                 
                 logger.info(f"Estado de prueba - Tiempo restante: {(end_time - datetime.now()).seconds} segundos")
                 logger.info(f"Precio actual: {current_price} USDT")
                 logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.system.bot.symbol.replace('USDT', '')}: {btc_balance}")
+                logger.info(f"Balance {base_asset}: {btc_balance}")
                 logger.info(f"Condición del mercado: {self.system.market_condition}")
                 
-                # Esperar antes de la siguiente verificación
-                time.sleep(self.check_interval)
+                # Esperar antes de la siguiente verificación (termina antes si el sistema se detiene)
+                wait([system_future], timeout=self.check_interval)
             
             # Detener el sistema al finalizar la prueba
             logger.info("Prueba completada. Deteniendo sistema...")
             self.system.stop()
-            system_thread.join(timeout=30)
+            wait([system_future], timeout=30)
+            if not system_future.done():
+                logger.warning("El sistema de trading no se ha detenido en 30 segundos; su hilo sigue en ejecución")
+            executor.shutdown(wait=False)
             
             logger.info("Prueba controlada finalizada exitosamente")
             return True
@@ -149,8 +164,12 @@ class OptimizedTradingSystemTester:
             
             # Verificar órdenes creadas durante la prueba
             try:
-                all_orders = self.client.get_all_orders(symbol=config.TRADING_SYMBOL)
-                recent_orders = [order for order in all_orders if int(order['time']) > (time.time() - self.test_duration) * 1000]
+                # Binance filtra por fecha en el servidor: solo se descargan las órdenes de la prueba
+                recent_orders = self.client.get_all_orders(
+                    symbol=config.TRADING_SYMBOL,
+                    startTime=int((time.time() - self.test_duration) * 1000),
+                    limit=1000
+                )
                 
                 logger.info(f"Órdenes creadas durante la prueba: {len(recent_orders)}")
                 for order in recent_orders:
@@ -159,12 +178,12 @@ class OptimizedTradingSystemTester:
             except BinanceAPIException as e:
                 logger.error(f"Error al verificar órdenes: {e}")
             
-            # Verificar si el historial de operaciones se ha guardado
-            if os.path.exists("trades_history.json"):
-                import json
-                with open("trades_history.json", "r") as f:
-                    trades_history = json.load(f)
-                logger.info(f"Historial de operaciones guardado: {len(trades_history)} operaciones")
+            # Verificar si el historial de operaciones se ha guardado (JSON Lines, una operación por línea:
+            # basta contar las líneas no vacías en binario, sin decodificar texto ni JSON)
+            if os.path.exists("trades_history.jsonl"):
+                with open("trades_history.jsonl", "rb") as f:
+                    trades_count = sum(1 for line in f if line.strip())
+                logger.info(f"Historial de operaciones guardado: {trades_count} operaciones")
             
             logger.info("Verificación de resultados completada")
             return True
@@ -218,24 +237,18 @@ class OptimizedTradingSystemTester:
         }
         
         try:
-            with open(log_file, 'r') as f:
-                content = f.readlines()
+            if os.path.getsize(log_file) == 0:
+                return metrics
             
-            for line in content:
-                if "Operaciones hoy:" in line:
-                    parts = line.split("Operaciones hoy:")[1].strip().split("/")
-                    if len(parts) > 0:
-                        metrics["operations_count"] = int(parts[0])
-                
-                if "Posición cerrada:" in line and "pnl" in line and "pnl': " in line:
-                    metrics["successful_operations"] += 1
-                
-                if "Cuadrícula" in line and "niveles" in line:
-                    parts = line.split("con")[1].split("niveles")[0].strip()
-                    try:
-                        metrics["grid_levels"] = int(parts)
-                    except:
-                        pass
+            # Una sola pasada del patrón combinado sobre el archivo mapeado en memoria
+            with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for match in _LOG_METRICS_PATTERN.finditer(mm):
+                    if match.lastindex == 1:
+                        metrics["operations_count"] = int(match.group(1))
+                    elif match.lastindex == 2:
+                        metrics["grid_levels"] = int(match.group(2))
+                    else:
+                        metrics["successful_operations"] += 1
             
             return metrics
         except Exception as e:
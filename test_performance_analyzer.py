@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las métricas de rendimiento de performance_analyzer
+"""
+
+import unittest
+import numpy as np
+from performance_analyzer import PerformanceAnalyzer
+
+class PerformanceMetricsTest(unittest.TestCase):
+    """Métricas calculadas sobre historiales en memoria (sin ficheros ni API)"""
+    
+    def setUp(self):
+        self.analyzer = PerformanceAnalyzer()
+    
+    def test_trades_without_pnl_are_skipped(self):
+        """Las operaciones sin PnL (NaN) se omiten en las sumas, como hacía pandas con skipna"""
+        trades = self.analyzer._build_trades_array([
+            {'timestamp': '2024-01-01T10:00:00', 'pnl': 5.0},
+            {'timestamp': '2024-01-01T12:00:00'},
+            {'timestamp': '2024-01-02T10:00:00', 'pnl': -2.0},
+            {'timestamp': '2024-01-03T10:00:00', 'pnl': 3.0},
+        ])
+        
+        metrics = self.analyzer.calculate_performance_metrics(trades)
+        
+        self.assertEqual(metrics['total_trades'], 4)
+        self.assertAlmostEqual(metrics['total_pnl'], 6.0)
+        self.assertAlmostEqual(metrics['max_drawdown'], 40.0)
+        # PnL diario [5, -2, 3]: media 2, desviación típica muestral sqrt(13)
+        self.assertAlmostEqual(metrics['sharpe_ratio'], 2 / np.sqrt(13) * np.sqrt(365))
+
+if __name__ == "__main__":
+    unittest.main()
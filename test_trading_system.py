@@ -54,11 +54,11 @@ class TradingSystemTester:
             # Verificar balances
             balances = {}
             for balance in account_info['balances']:
-                if float(balance['free']) > 0 or float(balance['locked']) > 0:
-                    balances[balance['asset']] = {
-                        'free': float(balance['free']),
-                        'locked': float(balance['locked'])
-                    }
+                # Cada cantidad se convierte a float una sola vez
+                free = float(balance['free'])
+                locked = float(balance['locked'])
+                if free > 0 or locked > 0:
+                    balances[balance['asset']] = {'free': free, 'locked': locked}
             
             # Verificar que hay USDT suficiente para las pruebas
             if 'USDT' not in balances or balances['USDT']['free'] < 100:
@@ -96,6 +96,7 @@ class TradingSystemTester:
             # Monitorear el sistema durante la duración de la prueba
             start_time = datetime.now()
             end_time = start_time + timedelta(seconds=self.test_duration)
+            base_asset = self.system.bot.symbol.replace("USDT", "")
             
             while datetime.now() < end_time:
                 # Verificar estado del sistema
@@ -106,12 +107,12 @@ class TradingSystemTester:
                 # Registrar estado actual
                 current_price = self.system.bot.get_current_price()
                 usdt_balance = self.system.bot.get_account_balance("USDT")
-                btc_balance = self.system.bot.get_account_balance(self.system.bot.symbol.replace("USDT", ""))
+                btc_balance = self.system.bot.get_account_balance(base_asset)
                 
                 logger.info(f"Estado de prueba - Tiempo restante: {(end_time - datetime.now()).seconds} segundos")
                 logger.info(f"Precio actual: {current_price} USDT")
                 logger.info(f"Balance USDT: {usdt_balance}")
-                logger.info(f"Balance {self.system.bot.symbol.replace('USDT', '')}: {btc_balance}")
+                logger.info(f"Balance {base_asset}: {btc_balance}")
                 
                 # Esperar antes de la siguiente verificación
                 time.sleep(self.check_interval)
@@ -148,8 +149,12 @@ class TradingSystemTester:
             
             # Verificar órdenes creadas durante la prueba
             try:
-                all_orders = self.client.get_all_orders(symbol=config.TRADING_SYMBOL)
-                recent_orders = [order for order in all_orders if int(order['time']) > (time.time() - self.test_duration) * 1000]
+                # Binance filtra por fecha en el servidor: solo se descargan las órdenes de la prueba
+                recent_orders = self.client.get_all_orders(
+                    symbol=config.TRADING_SYMBOL,
+                    startTime=int((time.time() - self.test_duration) * 1000),
+                    limit=1000
+                )
                 
                 logger.info(f"Órdenes creadas durante la prueba: {len(recent_orders)}")
                 for order in recent_orders:
@@ -158,12 +163,12 @@ class TradingSystemTester:
             except BinanceAPIException as e:
                 logger.error(f"Error al verificar órdenes: {e}")
             
-            # Verificar si el historial de operaciones se ha guardado
-            if os.path.exists("trades_history.json"):
-                import json
-                with open("trades_history.json", "r") as f:
-                    trades_history = json.load(f)
-                logger.info(f"Historial de operaciones guardado: {len(trades_history)} operaciones")
+            # Verificar si el historial de operaciones se ha guardado (JSON Lines, una operación por línea:
+            # basta contar las líneas no vacías en binario, sin decodificar texto ni JSON)
+            if os.path.exists("trades_history.jsonl"):
+                with open("trades_history.jsonl", "rb") as f:
+                    trades_count = sum(1 for line in f if line.strip())
+                logger.info(f"Historial de operaciones guardado: {trades_count} operaciones")
             
             logger.info("Verificación de resultados completada")
             return True